@@ -4,8 +4,6 @@ Library for the Modulation of Linear Systems
 # Author: Lukas Huber
 # Email: hubernikus@gmail.com
 # License: BSD (c) 2021
-import warnings
-
 import numpy as np
 import numpy.linalg as LA
 
@@ -93,10 +91,8 @@ def get_sticky_surface_imiation(relative_velocity, Gamma, E_orth, obs):
             )
 
 
-def compute_diagonal_matrix(
+def compute_diagonal_eigenvalues(
     Gamma,
-    dim,
-    is_boundary=False,
     rho=1,
     repulsion_coeff=1.0,
     tangent_eigenvalue_isometric=True,
@@ -104,7 +100,8 @@ def compute_diagonal_matrix(
     treat_obstacle_special=True,
     self_priority=1,
 ):
-    """Compute diagonal Matrix"""
+    """Returns the eigenvalues in reference and in tangent direction, i.e., the
+    two distinct values on the diagonal of the modulation matrix."""
     if Gamma <= 1 and treat_obstacle_special:
         # Point inside the obstacle
         delta_eigenvalue = 1
@@ -117,9 +114,31 @@ def compute_diagonal_matrix(
     else:
         # Decreasing velocity in order to reach zero on surface
         eigenvalue_tangent = 1 - 1.0 / abs(Gamma) ** tangent_power
-    return np.diag(
-        np.hstack((eigenvalue_reference, np.ones(dim - 1) * eigenvalue_tangent))
+    return eigenvalue_reference, eigenvalue_tangent
+
+
+def compute_diagonal_matrix(
+    Gamma,
+    dim,
+    is_boundary=False,
+    rho=1,
+    repulsion_coeff=1.0,
+    tangent_eigenvalue_isometric=True,
+    tangent_power=5,
+    treat_obstacle_special=True,
+    self_priority=1,
+):
+    """Compute diagonal Matrix"""
+    eigenvalue_reference, eigenvalue_tangent = compute_diagonal_eigenvalues(
+        Gamma,
+        rho=rho,
+        repulsion_coeff=repulsion_coeff,
+        tangent_eigenvalue_isometric=tangent_eigenvalue_isometric,
+        tangent_power=tangent_power,
+        treat_obstacle_special=treat_obstacle_special,
+        self_priority=self_priority,
     )
+    return np.diag([eigenvalue_reference] + [eigenvalue_tangent] * (dim - 1))
 
 
 def compute_decomposition_matrix(obs, x_t, in_global_frame=False, dot_margin=0.02):
@@ -144,58 +163,18 @@ def compute_decomposition_matrix(obs, x_t, in_global_frame=False, dot_margin=0.0
                 weights=np.array([weight, (1 - weight)]),
             )
 
-    E_orth = get_orthogonal_basis(normal_vector, normalize=True)
+    if normal_vector.shape[0] == 2 and np.any(normal_vector):
+        # The 2D basis is given directly by the normal and its rotation
+        nx, ny = normal_vector / np.hypot(normal_vector[0], normal_vector[1])
+        E_orth = np.array([[nx, -ny], [ny, nx]])
+    else:
+        E_orth = get_orthogonal_basis(normal_vector, normalize=True)
     E = np.copy((E_orth))
     E[:, 0] = -reference_direction
 
     return E, E_orth
 
 
-def compute_modulation_matrix(
-    x_t, obs, matrix_singularity_margin=np.pi / 2.0 * 1.05, angular_vel_weight=0
-):
-    # TODO: depreciated remove
-    """
-    The function evaluates the gamma function and all necessary components needed to
-    construct the modulation function, to ensure safe avoidance of the obstacles.
-    Beware that this function is constructed for ellipsoid only, but the algorithm
-    is applicable to star shapes.
-
-    Input
-    x_t [dim]: The position of the robot in the obstacle reference frame
-    obs [obstacle class]: Description of the obstacle with parameters
-
-    Output
-    E [dim x dim]: Basis matrix with rows the reference and tangent to the obstacles
-        surface
-    D [dim x dim]: Eigenvalue matrix which is responsible for the modulation
-    Gamma [dim]: Distance function to the obstacle surface (in direction of the
-        reference vector)
-    E_orth [dim x dim]: Orthogonal basis matrix with rows the normal and tangent
-    """
-    if True:
-        raise NotImplementedError("Depreciated ---- remove")
-    warnings.warn("Depreciated ---- remove")
-    dim = obs.dim
-
-    # if hasattr(obs, "rho"):
-    #     rho = np.array(obs.rho)
-    # else:
-    #     rho = 1
-
-    Gamma = obs.get_gamma(x_t, in_global_frame=False)  # function for ellipsoids
-
-    E, E_orth = compute_decomposition_matrix(obs, x_t, dim)
-    D = compute_diagonal_matrix(
-        Gamma,
-        dim=dim,
-        is_boundary=obs.is_boundary,
-        repulsion_coeff=obs.repulsion_coeff,
-    )
-
-    return E, D, Gamma, E_orth
-
-
 def obs_avoidance_interpolation_moving(
     position,
     initial_velocity,
@@ -275,14 +254,14 @@ def obs_avoidance_interpolation_moving(
 
     # Modulation matrices
     E = np.zeros((dim, dim, N_obs))
-    D = np.zeros((dim, dim, N_obs))
     E_orth = np.zeros((dim, dim, N_obs))
+    # Only the reference and the tangent eigenvalue of the diagonal matrices D
+    eigenvalues = np.zeros((2, N_obs))
 
     for n in np.arange(N_obs)[ind_obs]:
         # x_t = obs[n].transform_global2relative(x) # Move to obstacle centered frame
-        D[:, :, n] = compute_diagonal_matrix(
+        eigenvalues[:, n] = compute_diagonal_eigenvalues(
             Gamma[n],
-            dim,
             repulsion_coeff=obs[n].repulsion_coeff,
             tangent_eigenvalue_isometric=tangent_eigenvalue_isometric,
             rho=obs[n].reactivity,
@@ -340,26 +319,33 @@ def obs_avoidance_interpolation_moving(
                 relative_velocity_temp
             )
 
+            eigenvalue_reference, eigenvalue_tangent = eigenvalues[:, n]
             if obs[n].repulsion_coeff < 0:
                 # Negative Repulsion Coefficient at the back of an obstacle
                 if E_orth[:, 0, n].T.dot(relative_velocity) < 0:
                     # Adapt in reference direction
-                    D[0, 0, n] = 2 - D[0, 0, n]
+                    eigenvalue_reference = 2 - eigenvalue_reference
 
             # relative_velocity_trafo[0]>0
             elif not obs[n].tail_effect and (
                 (relative_velocity_trafo[0] > 0 and not obs[n].is_boundary)
                 or (relative_velocity_trafo[0] < 0 and obs[n].is_boundary)
             ):
-                D[0, 0, n] = 1  # No effect in 'radial direction'
-            stretched_velocity = D[:, :, n].dot(relative_velocity_trafo)
+                eigenvalue_reference = 1  # No effect in 'radial direction'
+
+            # Diagonal matrix D applied without creating it
+            stretched_velocity = eigenvalue_tangent * relative_velocity_trafo
+            stretched_velocity[0] = eigenvalue_reference * relative_velocity_trafo[0]
 
-            if D[0, 0, n] < 0:
+            if eigenvalue_reference < 0:
                 # Repulsion in tangent direction, too, have really active repulsion
                 factor_tangent_repulsion = 2
                 tang_vel_norm = LA.norm(relative_velocity_trafo[1:])
                 stretched_velocity[0] += (
-                    (-1) * D[0, 0, n] * tang_vel_norm * factor_tangent_repulsion
+                    (-1)
+                    * eigenvalue_reference
+                    * tang_vel_norm
+                    * factor_tangent_repulsion
                 )
 
             relative_velocity_hat[:, n] = E[:, :, n].dot(stretched_velocity)
@@ -30,12 +30,7 @@ class DistanceMatrix:
         return self._dim
 
     def __repr__(self):
-        matr = np.zeros((self._dim, self._dim))
-        for ii in range(self._dim):
-            for jj in range(ii + 1, self._dim):
-                matr[ii, jj] = matr[jj, ii] = self[ii, jj]
-
-        return str(matr)
+        return str(self.get_matrix())
 
     def __str__(self):
         return self.__repr__()
@@ -56,11 +51,14 @@ class DistanceMatrix:
 
     def get_matrix(self):
         """Get matrix as numpy-array."""
+        # The values are stored in the (row-wise) order of the upper triangle
         matr = np.zeros((self._dim, self._dim))
-        for ix in range(self._dim):
-            for iy in range(ix + 1, self._dim):
-                matr[ix, iy] = matr[iy, ix] = self[ix, iy]
-        return matr
+        matr[np.triu_indices(self._dim, k=1)] = self._value_list
+        return matr + matr.T
+
+    def set_matrix(self, matrix):
+        """Set all values from the upper triangle of a (symmetric) numpy-array."""
+        self._value_list[:] = matrix[np.triu_indices(self._dim, k=1)]
 
     def get_index(self, row, col):
         """Returns the corresponding list index [ind] from matrix index [row, col]"""
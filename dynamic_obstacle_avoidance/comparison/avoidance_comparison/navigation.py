@@ -8,10 +8,8 @@ from math import pi
 import numpy as np
 from numpy import linalg as LA
 
-from vartools.math import get_numerical_gradient
-
 from dynamic_obstacle_avoidance.containers import BaseContainer
-from dynamic_obstacle_avoidance.obstacles import Sphere
+from dynamic_obstacle_avoidance.obstacles import Ellipse, Sphere
 
 
 def get_rotation_matrix(rotation):
@@ -31,8 +29,14 @@ def get_beta_circle(obstacle, position):
 
 
 def get_beta(obstacle, position, in_global_frame=True):
-    """Beta / barrier function such that beta=0 when on boundary."""
-    gamma = obstacle.get_gamma(position, in_global_frame=in_global_frame)
+    """Beta / barrier function such that beta=0 when on boundary.
+    The position can be a single point of shape (dim,) or a batch of shape (dim, N)."""
+    if position.ndim > 1:
+        gamma = np.apply_along_axis(
+            obstacle.get_gamma, 0, position, in_global_frame=in_global_frame
+        )
+    else:
+        gamma = obstacle.get_gamma(position, in_global_frame=in_global_frame)
     return gamma - 1
     # norm_pos = LA.norm(position)
     # if obstacle.is_boundary:
@@ -43,8 +47,14 @@ def get_beta(obstacle, position, in_global_frame=True):
     # beta = norm_pos - local_radius
 
 
-def get_starset_deforming_factor(obstacle, beta, position=None, rel_obs_position=None):
-    """Get starshape deforming factor 'nu'."""
+def get_starset_deforming_factor(
+    obstacle, beta, position=None, rel_obs_position=None, min_dist=None
+):
+    """Get starshape deforming factor 'nu'.
+    The (position independent) minimal distance of the obstacle can be passed
+    to avoid recomputing it. The relative positions can be of shape
+    (dim, n_obstacles, N), with beta and min_dist broadcasting against
+    (n_obstacles, N)."""
     if rel_obs_position is None:
         if position is None:
             raise Exception(
@@ -53,12 +63,53 @@ def get_starset_deforming_factor(obstacle, beta, position=None, rel_obs_position
         rel_obs_position = position - obstacle.position
 
     # Min dist <=> radius of star-world representation
-    min_dist = obstacle.get_minimal_distance()
-    rel_radius = LA.norm(rel_obs_position) / (1 + beta)
+    if min_dist is None:
+        min_dist = obstacle.get_minimal_distance()
+    rel_radius = LA.norm(rel_obs_position, axis=0) / (1 + beta)
 
     return min_dist / rel_radius
 
 
+def get_navigation_value(rel_dist_attractor, beta_prod, kappa_factor):
+    """Navigation function value based on the distance to the attractor and the
+    product of all beta values; evaluates element-wise for arrays."""
+    return rel_dist_attractor**2 / (
+        rel_dist_attractor**kappa_factor + beta_prod
+    ) ** (1.0 / kappa_factor)
+
+
+def get_ellipse_gamma_batch(
+    positions, centers, rotation_matrices, inv_axes, curvatures
+):
+    """Returns the (obstacle) gamma of shape (n_obstacles, N) of ellipses for the
+    positions of shape (dim, N) in the global frame.
+
+    Ellipses are given by their centers (dim, n_obstacles), rotation matrices
+    (n_obstacles, dim, dim), inverse axes (dim, n_obstacles) and curvatures
+    (dim, n_obstacles)."""
+    rel_positions = positions[:, np.newaxis, :] - centers[:, :, np.newaxis]
+    if positions.shape[0] == 2:
+        # Explicit 2D rotation (local = R.T @ rel), avoids the generic einsum
+        rot = rotation_matrices[:, :, :, np.newaxis]
+        local_positions = np.stack(
+            (
+                rot[:, 0, 0] * rel_positions[0] + rot[:, 1, 0] * rel_positions[1],
+                rot[:, 0, 1] * rel_positions[0] + rot[:, 1, 1] * rel_positions[1],
+            )
+        )
+    else:
+        local_positions = np.einsum("oki,kon->ion", rotation_matrices, rel_positions)
+
+    powers = 2 * curvatures[:, :, np.newaxis]
+    return (
+        np.sum(
+            (np.abs(local_positions) * inv_axes[:, :, np.newaxis]) ** powers,
+            axis=0,
+        )
+        ** (1.0 / (2 * np.mean(curvatures, axis=0)))[:, np.newaxis]
+    )
+
+
 class SphereToStarTransformer(BaseContainer):
     """
     The transformation based on
@@ -81,6 +132,109 @@ class SphereToStarTransformer(BaseContainer):
 
         self.attractor_position = attractor_position
 
+        # Floating point type of the obstacle arrays and the grid evaluation,
+        # np.float32 is sufficient for visualization
+        self.dtype = np.float64
+
+    def update_obstacle_arrays(self):
+        """Stores the (ellipse) parameters of all obstacles in contiguous arrays.
+        Rebuilt for every batched evaluation, since the obstacles can be moved in
+        place (or the list shared) without the container being notified."""
+        dim = self.dimension
+        self._centers = np.zeros((dim, self.n_obstacles), dtype=self.dtype)
+        self._rotation_matrices = np.tile(
+            np.eye(dim, dtype=self.dtype), (self.n_obstacles, 1, 1)
+        )
+        self._inv_axes = np.zeros((dim, self.n_obstacles), dtype=self.dtype)
+        self._curvatures = np.zeros((dim, self.n_obstacles), dtype=self.dtype)
+        self._is_boundary = np.zeros(self.n_obstacles, dtype=bool)
+        self._min_dists = np.zeros(self.n_obstacles, dtype=self.dtype)
+
+        for oo, obs in enumerate(self._obstacle_list):
+            self._centers[:, oo] = obs.center_position
+            self._min_dists[oo] = obs.get_minimal_distance()
+            if obs.rotation_matrix is not None:
+                self._rotation_matrices[oo] = obs.rotation_matrix
+            self._is_boundary[oo] = obs.is_boundary
+
+            if isinstance(obs, Ellipse):
+                self._inv_axes[:, oo] = 1.0 / obs.axes_with_margin
+                self._curvatures[:, oo] = obs.curvature
+
+    def has_ellipse_obstacles_only(self):
+        """Checks if the gamma of all obstacles can be evaluated from the stored
+        obstacle arrays."""
+        return all(
+            isinstance(obs, Ellipse) and not obs.has_relative_gamma
+            for obs in self._obstacle_list
+        )
+
+    def get_gamma_values(self, positions):
+        """Returns the gamma values of shape (n_obstacles, N) of all (ellipse)
+        obstacles for the positions of shape (dim, N) in the global frame."""
+        self.update_obstacle_arrays()
+
+        gammas = get_ellipse_gamma_batch(
+            positions,
+            centers=self._centers,
+            rotation_matrices=self._rotation_matrices,
+            inv_axes=self._inv_axes,
+            curvatures=self._curvatures,
+        )
+
+        with np.errstate(divide="ignore"):
+            gammas[self._is_boundary] = 1.0 / gammas[self._is_boundary]
+        return gammas
+
+    def get_gamma_gradients(self, positions):
+        """Returns the (analytic) gradients of shape (dim, n_obstacles, N) of the
+        gamma of all (ellipse) obstacles for the positions of shape (dim, N)."""
+        self.update_obstacle_arrays()
+
+        rel_positions = positions[:, np.newaxis, :] - self._centers[:, :, np.newaxis]
+        local_positions = np.einsum(
+            "oki,kon->ion", self._rotation_matrices, rel_positions
+        )
+
+        powers = 2 * self._curvatures[:, :, np.newaxis]
+        gamma_power = 2 * np.mean(self._curvatures, axis=0)[:, np.newaxis]
+
+        scaled_positions = np.abs(local_positions) * self._inv_axes[:, :, np.newaxis]
+        gamma_sum = np.sum(scaled_positions**powers, axis=0)
+        gammas = gamma_sum ** (1.0 / gamma_power)
+
+        # d(gamma)/d(local_position) by the chain rule
+        local_gradients = (
+            gammas
+            / (gamma_power * gamma_sum)
+            * powers
+            * scaled_positions ** (powers - 1)
+            * self._inv_axes[:, :, np.newaxis]
+            * np.sign(local_positions)
+        )
+        gradients = np.einsum("oik,kon->ion", self._rotation_matrices, local_gradients)
+
+        # Boundaries have the inverted gamma
+        gradients[:, self._is_boundary] = (-1) * (
+            gradients[:, self._is_boundary] / gammas[self._is_boundary] ** 2
+        )
+        return gradients
+
+    def check_collision_array(self, positions: np.ndarray) -> np.ndarray:
+        """Return array of checked collisions of type bool."""
+        if not self.n_obstacles or not self.has_ellipse_obstacles_only():
+            return super().check_collision_array(positions)
+
+        return self.get_collisions_from_gammas(self.get_gamma_values(positions))
+
+    def get_collisions_from_gammas(self, gammas):
+        """Returns the collision array from gamma values of shape (n_obstacles, N)."""
+        # Obstacles are additive, boundaries are subtractive
+        collisions = np.any(gammas[~self._is_boundary] <= 1, axis=0)
+        if np.any(self._is_boundary):
+            collisions |= np.all(gammas[self._is_boundary] <= 1, axis=0)
+        return collisions
+
     @property
     def attractor_position(self):
         return self._attractor_position
@@ -90,10 +244,18 @@ class SphereToStarTransformer(BaseContainer):
         self._attractor_position = value
 
     def get_relative_attractor_position(self, position):
+        if position.ndim > 1:
+            return position - self.attractor_position[:, np.newaxis]
         return position - self.attractor_position
 
     def get_beta_values(self, position):
-        beta_values = np.zeros(self.n_obstacles)
+        """Returns beta values of shape (n_obstacles,) for a single position,
+        or of shape (n_obstacles, N) for a batch of positions of shape (dim, N)."""
+        if self.n_obstacles and self.has_ellipse_obstacles_only():
+            gammas = self.get_gamma_values(position.reshape(position.shape[0], -1))
+            return (gammas - 1).reshape((self.n_obstacles,) + position.shape[1:])
+
+        beta_values = np.zeros((self.n_obstacles,) + position.shape[1:])
         for oo, obstacle in enumerate(self._obstacle_list):
             beta_values[oo] = get_beta(obstacle, position)
         return beta_values
@@ -108,36 +270,89 @@ class SphereToStarTransformer(BaseContainer):
         # Or gamma_d /
         if not np.isinf(goal_norm_ord):
             goal_norm_ord = goal_norm_ord * 2
-        rel_dist_attractor = LA.norm(rel_pos_attractor, ord=goal_norm_ord)
-
-        if not rel_dist_attractor:
-            # Position at attractor
-            return np.zeros(beta_values.shape)
+        rel_dist_attractor = LA.norm(rel_pos_attractor, ord=goal_norm_ord, axis=0)
 
         ind_zero = np.isclose(beta_values, 0)
-        if np.sum(ind_zero) == 0:
-            beta_bar = (
-                np.tile(np.prod(beta_values), (beta_values.shape[0])) / beta_values
-            )
-        elif np.sum(ind_zero) == 1:
-            beta_bar = np.zeros(beta_values.shape)
-            beta_bar[ind_zero] = 1
-        else:
+        n_zeros = np.sum(ind_zero, axis=0)
+        if np.any(n_zeros > 1):
             raise Exception(
                 "Two zero-value beta's detected. This indicates an invalid \n"
                 + "environment of intersecting obstacles."
             )
 
-        scaled_dist = beta_bar * rel_dist_attractor**2
-        switch_value = scaled_dist / (scaled_dist + self.lambda_constant * beta_values)
-        # breakpoint()
-        return switch_value
-
-    def evaluate_dynamics(self, position):
-        gradient = get_numerical_gradient(
-            position=position, function=self.evaluate_navigation_function
+        # The product of all other betas (beta_bar) is evaluated in log-space to
+        # avoid under- / overflow of the product for many obstacles
+        abs_betas = np.where(ind_zero, 1.0, np.abs(beta_values))
+        signs = np.where(beta_values < 0, -1.0, 1.0)
+        log_betas = np.log(abs_betas)
+        beta_bar = np.exp(np.sum(log_betas, axis=0) - log_betas)
+        beta_bar *= np.prod(signs, axis=0) * signs
+
+        # On the surface of an obstacle, only this obstacle is switched on
+        beta_bar = np.where(n_zeros, ind_zero * beta_bar, beta_bar)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Reuse the temporaries in-place (no further allocations)
+            scaled_dist = np.multiply(beta_bar, rel_dist_attractor**2, out=beta_bar)
+            denominator = self.lambda_constant * beta_values
+            denominator += scaled_dist
+            switch_value = np.divide(scaled_dist, denominator, out=denominator)
+
+        # Position at attractor
+        return np.where(rel_dist_attractor, switch_value, 0)
+
+    def evaluate_dynamics(self, position, delta_dist=1e-6):
+        """Returns the negative gradient of the navigation function for a position
+        of shape (dim,) or a batch of positions of shape (dim, N).
+        The gradient is numerical, unless all obstacles are ellipses."""
+        if self.n_obstacles and self.has_ellipse_obstacles_only():
+            return (-1) * self.navigation_gradient(position)
+
+        dim = position.shape[0]
+        positions = position.reshape(dim, -1)
+
+        # All 2*dim central-difference probes are evaluated in a single batch
+        deltas = np.hstack((np.eye(dim), (-1) * np.eye(dim))) * delta_dist
+        probes = positions[:, np.newaxis, :] + deltas[:, :, np.newaxis]
+        values = self.evaluate_navigation_function(probes.reshape(dim, -1))
+        values = values.reshape(2, dim, -1)
+
+        gradient = (values[0] - values[1]) / (2 * delta_dist)
+        return ((-1) * gradient).reshape(position.shape)
+
+    def integrate_batch(
+        self, start_positions, n_steps, delta_time, convergence_velocity=1e-2
+    ):
+        """Integrates the dynamics for a batch of start positions of shape (dim, M)
+        with a Runge-Kutta (RK4) scheme. Trajectories whose velocity drops below
+        'convergence_velocity' are not updated anymore.
+
+        Returns the trajectories of shape (dim, n_steps+1, M), which are cut short
+        if all trajectories have converged before."""
+        trajectories = np.zeros(
+            (start_positions.shape[0], n_steps + 1, start_positions.shape[1])
         )
-        return (-1) * gradient
+        trajectories[:, 0, :] = start_positions
+
+        is_active = np.ones(start_positions.shape[1], dtype=bool)
+        for ii in range(n_steps):
+            position = trajectories[:, ii, is_active]
+
+            k1 = self.evaluate_dynamics(position)
+            k2 = self.evaluate_dynamics(position + 0.5 * delta_time * k1)
+            k3 = self.evaluate_dynamics(position + 0.5 * delta_time * k2)
+            k4 = self.evaluate_dynamics(position + delta_time * k3)
+
+            trajectories[:, ii + 1, :] = trajectories[:, ii, :]
+            trajectories[:, ii + 1, is_active] = position + delta_time / 6.0 * (
+                k1 + 2 * k2 + 2 * k3 + k4
+            )
+
+            is_active[is_active] = LA.norm(k1, axis=0) >= convergence_velocity
+            if not np.any(is_active):
+                return trajectories[:, : ii + 2, :]
+
+        return trajectories
 
     def transform_from_sphereworld(self, position):
         """Numerical guessing / transforming to estimate the backtrafo."""
@@ -160,54 +375,43 @@ class SphereToStarTransformer(BaseContainer):
         return pos_star_guess
 
     def transform_to_sphereworld(self, position):
-        """h(x) -"""
-        # rel_pos_obstacle = np.zeros((self.dimension, self.n_obstacles))
+        """h(x) - position of shape (dim,) or batch of positions of shape (dim, N)."""
         rel_pos_attractor = self.get_relative_attractor_position(position)
         beta_values = self.get_beta_values(position)
         analytic_switches = self.get_analytic_switches(
             rel_pos_attractor=rel_pos_attractor, beta_values=beta_values
         )
 
-        # TODO: they don't really need to be temporarily safed after loop...
-        position_starshape = np.zeros((position.shape[0], beta_values.shape[0]))
-        # position_starshape = np.zeros(position.shape)
-
-        weighted_points = []  # Debug only
-
-        for ii in range(self.n_obstacles):
-            rel_obs_position = position - self[ii].position
-            # rel_obs_position = rel_obs_position/LA.norm(rel_obs_position)
-
-            mu = get_starset_deforming_factor(
-                self[ii],
-                beta=beta_values[ii],
-                rel_obs_position=rel_obs_position,
-            )
-
-            # mu[ii] = 1
-            position_starshape[:, ii] = analytic_switches[ii] * (
-                mu * rel_obs_position + self[ii].position
-            )
-
-            weighted_points.append((mu * rel_obs_position + self[ii].position))
-
-        if False:
-            import matplotlib.pyplot as plt
+        self.update_obstacle_arrays()
+
+        # Evaluate all obstacles at once on arrays of shape (dim, n_obstacles, N)
+        dim = position.shape[0]
+        positions = position.reshape(dim, -1)
+        centers = self._centers[:, :, np.newaxis]
+        rel_obs_positions = positions[:, np.newaxis, :] - centers
+
+        # Starshape deforming factor 'mu' of each obstacle
+        beta_values = beta_values.reshape(self.n_obstacles, -1)
+        mu = get_starset_deforming_factor(
+            obstacle=None,
+            beta=beta_values,
+            rel_obs_position=rel_obs_positions,
+            min_dist=self._min_dists[:, np.newaxis],
+        )
 
-            plt.figure()
-            plt.plot(position[0], position[1], "g*")
-            for pp in weighted_points:
-                plt.plot(pp[0], pp[1], "ro")
-            breakpoint()
+        position_starshape = np.einsum(
+            "on,don->dn",
+            analytic_switches.reshape(self.n_obstacles, -1),
+            mu * rel_obs_positions + centers,
+            optimize=True,
+        ).reshape(position.shape)
 
-        switch_goal = 1 - np.sum(analytic_switches)
+        switch_goal = 1 - np.sum(analytic_switches, axis=0)
         x_g = self.attractor_position
         q_g = self.attractor_position
-        pos_summed = np.sum(position_starshape, axis=1) + switch_goal * (
-            position - x_g + q_g
-        )
-        # breakpoint()
-        return pos_summed
+        if position.ndim > 1:
+            x_g, q_g = x_g[:, np.newaxis], q_g[:, np.newaxis]
+        return position_starshape + switch_goal * (position - x_g + q_g)
 
     def transform_to_sphereworld_velocity(self, position, velocity, delta_time=1e-3):
         """Returns transformed 'velocity' in sphere world at 'position'."""
@@ -234,17 +438,6 @@ class SphereToStarTransformer(BaseContainer):
 
 class NavigationContainer(SphereToStarTransformer):
     # TODO: Cohesion not coupling (!)
-    def get_minimum_epsilon(self, variable=None):
-        pass
-
-    def get_minimum_N(self, variable=None):
-        epsilon = None
-        return 0.5 * 1 / epsilon
-        pass
-
-    def rho0(self):
-        pass
-
     def get_epsilon_factor(self):
         """
         Return the epsilon factor for the navigation-fuction.
@@ -252,32 +445,8 @@ class NavigationContainer(SphereToStarTransformer):
         rho: radius
         q: (center) position
         """
-        if True:
-            # Simple value
-            return 1e-3
-
-        # Token evaluation
-        rho0 = self.boundary.radius
-
-        beta_i_max = np.zeros(self.n_obstacles)
-        for ii in range(self.n_obstacles):
-            beta_i_max[ii] = (rho0 + LA.norm(self.center_position)) ** 2 - self[
-                ii
-            ].radius ** 2
-
-            if self[ii].is_boundary:
-                beta_i_max[ii] = rho0**2
-
-        norm_beta_i_j_grad_min = np.zeros(
-            (self.dimension, self.n_obstacles, self.n_obstacles)
-        )
-        for ii in range(self.n_obstacles):
-            for jj in range(self.n_obstacles):
-                if ii == jj:
-                    norm_beta_i_j_grad_min[:, ii, jj] = 2 * self[ii].radius
-                    continue
-                epsilon = None
-                norm_beta_i_j_grad_min[:, ii, jj] = 2 * (np.sqrt(epsilon))
+        # Simple value
+        return 1e-3
 
         # gradient_of_beta_i = np.zeros(0)
         # hessian_of_beta_i = np.zeros(0)
@@ -317,12 +486,87 @@ class NavigationContainer(SphereToStarTransformer):
 
         if beta_prod is None:
             beta_values = self.get_beta_values(position)
-            beta_prod = np.prod(beta_values)
+            beta_prod = np.prod(beta_values, axis=0)
 
         rel_pos_attractor = self.get_relative_attractor_position(position)
-        rel_dist_attractor = LA.norm(rel_pos_attractor)
+        if position.shape[0] == 2:
+            rel_dist_attractor = np.hypot(rel_pos_attractor[0], rel_pos_attractor[1])
+        else:
+            rel_dist_attractor = LA.norm(rel_pos_attractor, axis=0)
 
-        phi = rel_dist_attractor**2 / (
-            rel_dist_attractor**kappa_factor + beta_prod
-        ) ** (1.0 / kappa_factor)
-        return phi
+        return get_navigation_value(rel_dist_attractor, beta_prod, kappa_factor)
+
+    def navigation_gradient(self, position, kappa_factor=None, beta_values=None):
+        """Returns the analytic gradient of the navigation function for a position
+        of shape (dim,) or a batch of positions of shape (dim, N).
+        Only applicable if all obstacles are ellipses."""
+        if kappa_factor is None:
+            kappa_factor = self.default_kappa_factor
+
+        dim = position.shape[0]
+        positions = position.reshape(dim, -1)
+
+        if beta_values is None:
+            beta_values = self.get_gamma_values(positions) - 1
+        beta_gradients = self.get_gamma_gradients(positions)
+
+        # grad(prod beta_i) = sum_i (prod_j!=i beta_j) * grad(beta_i)
+        beta_bar = np.zeros(beta_values.shape)
+        for oo in range(self.n_obstacles):
+            beta_bar[oo] = np.prod(np.delete(beta_values, oo, axis=0), axis=0)
+        beta_prod = np.prod(beta_values, axis=0)
+        beta_prod_gradient = np.sum(beta_bar * beta_gradients, axis=1)
+
+        rel_pos_attractor = self.get_relative_attractor_position(positions)
+        rel_dist_attractor = LA.norm(rel_pos_attractor, axis=0)
+
+        denominator = rel_dist_attractor**kappa_factor + beta_prod
+        gradient = 2 * rel_pos_attractor * denominator ** (-1.0 / kappa_factor)
+        gradient -= (
+            rel_dist_attractor**2
+            / kappa_factor
+            * denominator ** (-1.0 / kappa_factor - 1)
+            * (
+                kappa_factor
+                * rel_dist_attractor ** (kappa_factor - 2)
+                * rel_pos_attractor
+                + beta_prod_gradient
+            )
+        )
+        return gradient.reshape(position.shape)
+
+    def evaluate_grid(self, positions, kappa_factor=None):
+        """Evaluates the navigation function, the collisions and the velocities
+        (negative gradient) for positions of shape (dim, N) in a single pass.
+        Navigation value and velocity are only evaluated for non-colliding
+        positions and are zero otherwise."""
+        if kappa_factor is None:
+            kappa_factor = self.default_kappa_factor
+
+        positions = positions.astype(self.dtype, copy=False)
+        values = np.zeros(positions.shape[1], dtype=self.dtype)
+        velocities = np.zeros(positions.shape, dtype=self.dtype)
+
+        if not self.n_obstacles or not self.has_ellipse_obstacles_only():
+            collisions = self.check_collision_array(positions)
+            is_free = ~collisions
+            values[is_free] = self.evaluate_navigation_function(
+                positions[:, is_free], kappa_factor=kappa_factor
+            )
+            velocities[:, is_free] = self.evaluate_dynamics(positions[:, is_free])
+            return values, collisions, velocities
+
+        gammas = self.get_gamma_values(positions)
+        collisions = self.get_collisions_from_gammas(gammas)
+        is_free = ~collisions
+
+        beta_values = gammas[:, is_free] - 1
+        values[is_free] = self.evaluate_navigation_function(
+            positions[:, is_free],
+            beta_prod=np.prod(beta_values, axis=0),
+            kappa_factor=kappa_factor,
+        )
+        velocities[:, is_free] = (-1) * self.navigation_gradient(
+            positions[:, is_free], kappa_factor=kappa_factor, beta_values=beta_values
+        )
+        return values, collisions, velocities
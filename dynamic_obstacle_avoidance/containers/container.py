@@ -146,10 +146,7 @@ class BaseContainer(ABC):
         gamma_array = np.zeros((len(self._obstacle_list), positions.shape[1]))
 
         for ii, obs in enumerate(self._obstacle_list):
-            for jj in range(positions.shape[1]):
-                gamma_array[ii, jj] = obs.get_gamma(
-                    positions[:, jj], in_global_frame=True
-                )
+            gamma_array[ii, :] = obs.get_gamma_batch(positions, in_global_frame=True)
 
         return np.min(gamma_array, axis=0)
 
@@ -13,6 +13,9 @@ import time
 
 from shapely.ops import nearest_points
 
+from vartools.linalg import get_orthogonal_basis
+from vartools.directional_space import get_angle_space, get_angle_space_inverse
+
 from dynamic_obstacle_avoidance.utils import get_reference_weight
 
 from dynamic_obstacle_avoidance.obstacles import CircularObstacle
@@ -39,6 +42,7 @@ class GradientContainer(ObstacleContainer):
             super(GradientContainer, self).__init__(obs_list)
 
         self._obstacle_is_updated = np.ones(self.number, dtype=bool)
+        self._null_matrix_cache = {}
 
         if len(self):
             self._boundary_reference_points = np.zeros((self.dim, len(self), len(self)))
@@ -56,6 +60,8 @@ class GradientContainer(ObstacleContainer):
         else:  # Python 2 compatibility
             super(GradientContainer, self).append(value)
 
+        self._null_matrix_cache = {}
+
         # Always reset dist matrix
         if True:
             # if len(self)==1:
@@ -88,10 +94,7 @@ class GradientContainer(ObstacleContainer):
                 )
             )
 
-            for ii in range(len(self)):
-                for jj in range(ii + 1, len(self)):
-                    new_dist_matr[ii, jj] = distance_matrix[ii, jj]
-
+            new_dist_matr.set_matrix(distance_matrix)
             self._distance_matrix = new_dist_matr
 
     def __delitem__(self, key):  # Compatibility with normal list.
@@ -102,6 +105,9 @@ class GradientContainer(ObstacleContainer):
         else:  # Python 2 compatibility
             super(GradientContainer, self).__delitem__(key)
 
+        # Pairs are stored by index, which shifted
+        self._null_matrix_cache = {}
+
         # update boundary reference point & distance matrix
         if len(self) == 0:
             self._boundary_reference_points = None
@@ -119,10 +125,7 @@ class GradientContainer(ObstacleContainer):
             distance_matrix = np.delete(distance_matrix, (key), axis=1)
 
             new_dist_matr = DistanceMatrix(n_obs=len(self))
-            for ii in range(len(self)):
-                for jj in range(ii + 1, len(self)):
-                    new_dist_matr[ii, jj] = self._distance_matrix[ii, jj]
-
+            new_dist_matr.set_matrix(distance_matrix)
             self._distance_matrix = new_dist_matr
 
     @property
@@ -170,6 +173,15 @@ class GradientContainer(ObstacleContainer):
         value = self[ii].transform_global2relative(value)
         self._boundary_reference_points[:, ii, jj] = value
 
+    def _update_obstacle_arrays(self):
+        """Gathers the center positions, reference lengths and boundary flags of all
+        obstacles in arrays, such that the pairwise evaluation does not need to access
+        each obstacle. They are gathered at every update, since the obstacles can be
+        moved without notifying the container."""
+        self._center_positions = np.array([obs.center_position for obs in self]).T
+        self._reference_lengths = np.array([obs.get_reference_length() for obs in self])
+        self._is_boundary = np.array([obs.is_boundary for obs in self], dtype=bool)
+
     def update_reference_points(self):
         """Update the reference point for all obstacles stored in (this)
         container based on distance"""
@@ -184,26 +196,19 @@ class GradientContainer(ObstacleContainer):
         self.update_boundary_reference_points()
         delta_t = time.time() - now
 
-        obs_reference_size = np.zeros(len(self))
+        obs_reference_size = self._reference_lengths
 
-        for ii in range(len(self)):
-            obs_reference_size[ii] = self[ii].get_reference_length()
+        # Distances between all obstacles, (-1) marks no distance (or itself)
+        distance_matrix = self._distance_matrix.get_matrix()
+        distance_matrix[distance_matrix < 0] = -1
+        np.fill_diagonal(distance_matrix, -1)
 
         for ii in range(len(self)):
             # Boundaries have constant center
-            if self[ii].is_boundary:
+            if self._is_boundary[ii]:
                 continue
 
-            distances = np.zeros(len(self))
-            for jj in range(len(self)):
-                if ii == jj:
-                    # DistanceMatrix[ii, jj] = \
-                    distances[jj] = -1
-                else:
-                    # DistanceMatrix[ii, jj] =
-                    distances[jj] = self.get_distance(ii, jj)
-
-            weights = get_reference_weight(distances, obs_reference_size)
+            weights = get_reference_weight(distance_matrix[ii, :], obs_reference_size)
 
             # print('weights', np.round(weights, 2))
             if np.sum(weights):
@@ -272,157 +277,182 @@ class GradientContainer(ObstacleContainer):
         # Compare two (2) obstacles to each other
         n_com = 2
 
-        # Iterate over all obstacles (but last element, because nothing to compare to)
-        for ii in range(len(self) - 1):
-            size_ii = self[ii].get_reference_length()
-            for jj in range(ii + 1, len(self)):
-                # Only update if either of the obstacles has 'moved/updated' previously
-                # if not (self[ii].has_moved or self[jj].has_moved):
-                # continue
-
-                # Check if exeeds maximal distance
-                size_jj = self[ii].get_reference_length()
-                dist_ii2jj = np.linalg.norm(
-                    self[ii].center_position - self[jj].center_position
-                )
+        self._update_obstacle_arrays()
+        center_positions = self._center_positions
+        sizes = self._reference_lengths
 
-                # Don't calculate if obstacles are too far away from each other
-                if (
-                    dist_ii2jj - (size_ii + size_jj)
-                    > max(size_ii, size_jj) * mult_consideration_dist
-                ):
-                    # print("Too far away")
-                    continue
-
-                # Speed up process for circular obstacles
-                if (
-                    isinstance(self[ii], CircularObstacle)
-                    and isinstance(self[jj], CircularObstacle)
-                ) or need_for_speed:
-
-                    (
-                        dist,
-                        ref_point1,
-                        ref_point2,
-                    ) = self.get_boundary_reference_point_simplified(self[ii], self[jj])
-
-                    self.set_distance(ii, jj, dist)
-                    self.set_boundary_reference_point(ii, jj, ref_point1)
-                    if not ref_point2 is None:
-                        # Is a boundary with 'static reference point'
-                        self.set_boundary_reference_point(jj, ii, ref_point2)
-
-                    if dist <= 0:
-                        # Distance==0, i.e. intersecting & ref_point1==ref_point2
-                        self.intersection_matrix[ii, jj] = ref_point1
-                    continue
-
-                center_dists = np.zeros((self.dim, n_com))
-                center_dists[:, 1] = self[ii].center_position - self[jj].center_position
-
-                if self[jj].is_boundary:
-                    # If compare to the boundary, then the obstacle has to look outwards (wall)
-                    center_dists[:, 0] = center_dists[:, 1]
-                else:
-                    center_dists[:, 0] = (-1) * center_dists[:, 1]
+        # Filter all obstacle-pairs (ii < jj) at once
 
-                if np.linalg.norm(center_dists[:, 0]) > 1e10 and not self.is_boundary:
-                    # TODO: Check & Test this exception!
-                    self.set_distance(ii, jj, 0)  # TODO: check if 0 or -1 ?
-                    self.intersection_matrix[ii, jj] = self[ii].center_position
-                    continue
+        it_obs0, it_obs1 = np.triu_indices(len(self), k=1)
+        dists_centers = np.linalg.norm(
+            center_positions[:, it_obs0] - center_positions[:, it_obs1], axis=0
+        )
 
-                elif self.get_distance(ii, jj) < 0:
-                    is_close_for_the_first_time = True
+        # Don't calculate if obstacles are too far away from each other
+        size0, size1 = sizes[it_obs0], sizes[it_obs1]
+        ind_close = dists_centers - (size0 + size1) <= (
+            np.maximum(size0, size1) * mult_consideration_dist
+        )
 
-                else:
-                    is_close_for_the_first_time = False
+        for ii, jj in zip(it_obs0[ind_close], it_obs1[ind_close]):
+            # Bound once, the loop body accesses both obstacles repeatedly
+            obs0, obs1 = self[ii], self[jj]
 
-                angles = np.zeros((dim - 1) * 2)
-                surf_points = np.zeros((dim, 2))
+            # Only update if either of the obstacles has 'moved/updated' previously
+            # if not (self[ii].has_moved or self[jj].has_moved):
+            # continue
 
-                # Gamma based descent
-                if is_close_for_the_first_time:
-                    surf_points[:, 0] = self[ii].get_local_radius_point(
-                        direction=center_dists[:, 0], in_global_frame=True
-                    )
+            # Speed up process for circular obstacles
+            if (
+                isinstance(obs0, CircularObstacle)
+                and isinstance(obs1, CircularObstacle)
+            ) or need_for_speed:
 
-                    surf_points[:, 1] = self[jj].get_local_radius_point(
-                        direction=center_dists[:, 1], in_global_frame=True
-                    )
+                (
+                    dist,
+                    ref_point1,
+                    ref_point2,
+                ) = self.get_boundary_reference_point_simplified(obs0, obs1)
+
+                self.set_distance(ii, jj, dist)
+                self.set_boundary_reference_point(ii, jj, ref_point1)
+                if not ref_point2 is None:
+                    # Is a boundary with 'static reference point'
+                    self.set_boundary_reference_point(jj, ii, ref_point2)
 
-                else:
-                    surf_points[:, 0] = self.get_boundary_reference_point(ii, jj)
-                    surf_points[:, 1] = self.get_boundary_reference_point(jj, ii)
-
-                # Check if any of the surface points is inside the other object
-                margin = 1e-4
-                if (
-                    self[ii].get_gamma(surf_points[:, 1], in_global_frame=True)
-                    <= 1 + margin
-                    or self[jj].get_gamma(surf_points[:, 0], in_global_frame=True)
-                    <= 1 + margin
-                ):
-                    # The obstacle is intersecting
-                    print("Touching initially -- Gamma Descent")
-
-                    self[ii].get_gamma(surf_points[:, 1], in_global_frame=True)
-
-                    reference_point = self.gamma_gradient_descent(
-                        self[ii],
-                        self[jj],
-                        common_point=np.mean(surf_points, axis=1),
-                    )
+                if dist <= 0:
+                    # Distance==0, i.e. intersecting & ref_point1==ref_point2
+                    self.intersection_matrix[ii, jj] = ref_point1
+                continue
 
-                    # Set the boundary reference point on for the obstacle-pair
-                    self.set_boundary_reference_point(ii, jj, reference_point)
-                    self.set_boundary_reference_point(jj, ii, reference_point)
-                    self.intersection_matrix[ii, jj] = reference_point
-                    self.set_distance(ii, jj, 0)
+            center_dists = np.zeros((self.dim, n_com))
+            center_dists[:, 1] = center_positions[:, ii] - center_positions[:, jj]
 
-                else:
-                    NullMatrices = np.zeros((n_com, dim, dim))
-                    NullMatrices[0, :, :] = get_orthogonal_basis(center_dists[:, 0])
-                    NullMatrices[1, :, :] = get_orthogonal_basis(center_dists[:, 1])
-
-                    # Get angles and do iteration
-                    if not is_close_for_the_first_time:
-                        for kk, obstacle in zip(range(2), (self[ii], self[jj])):
-                            angles[
-                                kk * (dim - 1) : (kk + 1) * (dim - 1)
-                            ] = get_angle_space(
-                                directions=surf_points[:, kk]
-                                - obstacle.center_position,
-                                OrthogonalBasisMatrix=NullMatrices[kk, :, :],
+            if self._is_boundary[jj]:
+                # If compare to the boundary, then the obstacle has to look outwards (wall)
+                center_dists[:, 0] = center_dists[:, 1]
+            else:
+                center_dists[:, 0] = (-1) * center_dists[:, 1]
+
+            if np.linalg.norm(center_dists[:, 0]) > 1e10 and not self.is_boundary:
+                # TODO: Check & Test this exception!
+                self.set_distance(ii, jj, 0)  # TODO: check if 0 or -1 ?
+                self.intersection_matrix[ii, jj] = center_positions[:, ii]
+                continue
+
+            elif self.get_distance(ii, jj) < 0:
+                is_close_for_the_first_time = True
+
+            else:
+                is_close_for_the_first_time = False
+
+            angles = np.zeros((dim - 1) * 2)
+            surf_points = np.zeros((dim, 2))
+
+            # Gamma based descent
+            if is_close_for_the_first_time:
+                surf_points[:, 0] = obs0.get_local_radius_point(
+                    direction=center_dists[:, 0], in_global_frame=True
+                )
+
+                surf_points[:, 1] = obs1.get_local_radius_point(
+                    direction=center_dists[:, 1], in_global_frame=True
+                )
+
+            else:
+                surf_points[:, 0] = self.get_boundary_reference_point(ii, jj)
+                surf_points[:, 1] = self.get_boundary_reference_point(jj, ii)
+
+            # Check if any of the surface points is inside the other object
+            margin = 1e-4
+            if (
+                obs0.get_gamma(surf_points[:, 1], in_global_frame=True) <= 1 + margin
+                or obs1.get_gamma(surf_points[:, 0], in_global_frame=True) <= 1 + margin
+            ):
+                # The obstacle is intersecting
+                print("Touching initially -- Gamma Descent")
+
+                obs0.get_gamma(surf_points[:, 1], in_global_frame=True)
+
+                reference_point = self.gamma_gradient_descent(
+                    obs0,
+                    obs1,
+                    common_point=np.mean(surf_points, axis=1),
+                )
+
+                # Set the boundary reference point on for the obstacle-pair
+                self.set_boundary_reference_point(ii, jj, reference_point)
+                self.set_boundary_reference_point(jj, ii, reference_point)
+                self.intersection_matrix[ii, jj] = reference_point
+                self.set_distance(ii, jj, 0)
+
+            else:
+                NullMatrices = self._get_null_matrices(ii, jj, center_dists)
+
+                # Get angles and do iteration
+                if not is_close_for_the_first_time:
+                    for kk, obstacle in zip(range(2), (obs0, obs1)):
+                        angles[kk * (dim - 1) : (kk + 1) * (dim - 1)] = get_angle_space(
+                            directions=surf_points[:, kk] - obstacle.center_position,
+                            OrthogonalBasisMatrix=NullMatrices[kk, :, :],
+                        )
+
+                        # Reset if too far out
+                        if (
+                            np.linalg.norm(
+                                angles[kk * (dim - 1) : (kk + 1) * (dim - 1)]
                             )
+                            > pi
+                        ):
+                            angles[kk * (dim - 1) : (kk + 1)(dim - 1)] = 0
 
-                            # Reset if too far out
-                            if (
-                                np.linalg.norm(
-                                    angles[kk * (dim - 1) : (kk + 1) * (dim - 1)]
-                                )
-                                > pi
-                            ):
-                                angles[kk * (dim - 1) : (kk + 1)(dim - 1)] = 0
-
-                    cent_points = np.zeros((dim, 2))
-
-                    dist, ref_point1, ref_point2 = self.angle_gradient_descent(
-                        self[ii],
-                        self[jj],
-                        angles=angles,
-                        NullMatrices=NullMatrices,
-                    )
+                cent_points = np.zeros((dim, 2))
 
-                    self.set_distance(ii, jj, dist)
+                dist, ref_point1, ref_point2 = self.angle_gradient_descent(
+                    obs0,
+                    obs1,
+                    angles=angles,
+                    NullMatrices=NullMatrices,
+                )
 
-                    # if dist>0:
-                    self.set_boundary_reference_point(ii, jj, ref_point1)
-                    self.set_boundary_reference_point(jj, ii, ref_point2)
+                self.set_distance(ii, jj, dist)
+
+                # if dist>0:
+                self.set_boundary_reference_point(ii, jj, ref_point1)
+                self.set_boundary_reference_point(jj, ii, ref_point2)
+
+                if dist <= 0:
+                    # Distance==0, i.e. intersecting & ref_point1==ref_point2
+                    self.intersection_matrix[ii, jj] = ref_point1
+
+    def _get_null_matrices(self, ii, jj, center_dists):
+        """Returns the orthogonal bases of the two center directions of an
+        obstacle pair. They are stored per pair, since static pairs keep the
+        same center directions over many updates."""
+        cached = self._null_matrix_cache.get((ii, jj))
+        if cached is not None and np.array_equal(cached[0], center_dists):
+            return cached[1]
+
+        dim = center_dists.shape[0]
+        if dim == 2:
+            # Basis is [v, v_perp]; the basis of (-v) is its negative
+            direction = center_dists[:, 1] / np.linalg.norm(center_dists[:, 1])
+            null_matrices = np.empty((2, dim, dim))
+            null_matrices[1, :, 0] = direction
+            null_matrices[1, 0, 1] = (-1) * direction[1]
+            null_matrices[1, 1, 1] = direction[0]
+
+            if np.array_equal(center_dists[:, 0], center_dists[:, 1]):
+                null_matrices[0, :, :] = null_matrices[1, :, :]
+            else:
+                null_matrices[0, :, :] = (-1) * null_matrices[1, :, :]
+        else:
+            null_matrices = np.zeros((2, dim, dim))
+            null_matrices[0, :, :] = get_orthogonal_basis(center_dists[:, 0])
+            null_matrices[1, :, :] = get_orthogonal_basis(center_dists[:, 1])
 
-                    if dist <= 0:
-                        # Distance==0, i.e. intersecting & ref_point1==ref_point2
-                        self.intersection_matrix[ii, jj] = ref_point1
+        self._null_matrix_cache[(ii, jj)] = (center_dists.copy(), null_matrices)
+        return null_matrices
 
     def get_boundary_reference_point_simplified(self, obs0, obs1):
         """Accelerated calculation for circles.
@@ -487,7 +517,6 @@ class GradientContainer(ObstacleContainer):
 
         dim = obs0.dim
 
-        surface_points = np.zeros((dim, 2))
         surface_derivatives = np.zeros((dim, 2))
 
         # Setup for numerical gradient descent
@@ -503,25 +532,19 @@ class GradientContainer(ObstacleContainer):
         is_intersecting = False
 
         # Check if step leads to convergence  (expensive but worth it)
-        for obs, ii in zip([obs0, obs1], [0, 1]):
-            angle = angles[ii * (dim - 1) : (ii + 1) * (dim - 1)]
-            direction_angle = get_angle_space_inverse(
-                angle, NullMatrix=NullMatrices[ii, :, :]
-            )
-
-            surface_points[:, ii] = obs.get_local_radius_point(
-                direction=direction_angle, in_global_frame=True
-            )
+        surface_points = self._get_surface_points_of_angles(
+            obs0, obs1, angles, NullMatrices
+        )
 
         dist_dir = surface_points[:, 1] - surface_points[:, 0]
-        dist_magnitude = np.linalg.norm(dist_dir)
+        dist_magnitude = np.sqrt(dist_dir.dot(dist_dir))
 
         t_start_graddescent = time.time()
         while not is_intersecting:
             # Gradient descent in the angle space of the obstacle
             for obs, ii in zip([obs0, obs1], [0, 1]):
                 angle = angles[ii * (dim - 1) : (ii + 1) * (dim - 1)]
-                if np.linalg.norm(angle) > pi:
+                if angle.dot(angle) > pi**2:
                     angle[:] = 0
                 # TODO: more efficient surface derivative
                 surface_derivatives[:, ii] = obs.get_surface_derivative_angle_num(
@@ -531,26 +554,18 @@ class GradientContainer(ObstacleContainer):
                 )
 
             # Calculate step
-            delta_angle = (
-                0.5
-                / dist_magnitude
-                * np.array(
-                    [
-                        -dist_dir.dot(surface_derivatives[:, 0]),
-                        dist_dir.dot(surface_derivatives[:, 1]),
-                    ]
-                )
-            )
+            delta_angle = dist_dir.dot(surface_derivatives)
+            delta_angle[0] = (-1) * delta_angle[0]
 
             # Backtracking line search
             step_size = beta * step_size
 
             # Calculate new angle (points in direction space)
-            step = alpha * step_size * delta_angle
+            step = (alpha * step_size * 0.5 / dist_magnitude) * delta_angle
             angles_new = angles - step
 
             # Stop after maximum iteration or absolute convergence error
-            if np.linalg.norm(step) < convergence_err:
+            if step.dot(step) < convergence_err * convergence_err:
                 print(
                     "Convergence of angle descent reached at iteration {}.".format(
                         it_count
@@ -559,18 +574,12 @@ class GradientContainer(ObstacleContainer):
                 break
 
             # Check if step leads to convergence  (expensive but worth it)
-            for obs, ii in zip([obs0, obs1], [0, 1]):
-                angle = angles_new[ii * (dim - 1) : (ii + 1) * (dim - 1)]
-                direction_angle = get_angle_space_inverse(
-                    angle, NullMatrix=NullMatrices[ii, :, :]
-                )
-
-                surface_points[:, ii] = obs.get_local_radius_point(
-                    direction=direction_angle, in_global_frame=True
-                )
+            surface_points = self._get_surface_points_of_angles(
+                obs0, obs1, angles_new, NullMatrices
+            )
 
             dist_dir = surface_points[:, 1] - surface_points[:, 0]
-            dist_magnitude_new = np.linalg.norm(dist_dir)
+            dist_magnitude_new = np.sqrt(dist_dir.dot(dist_dir))
 
             if dist_magnitude_new < contact_err:
                 is_intersecting = True
@@ -602,14 +611,9 @@ class GradientContainer(ObstacleContainer):
                 print("Maximum {} iterations reached".format(it_count))
                 break
 
-        reference_points = np.zeros((dim, 2))
-        for obs, ii in zip((obs0, obs1), [0, 1]):
-            angle = angles[ii * (dim - 1) : (ii + 1) * (dim - 1)]
-            dir0 = get_angle_space_inverse(angle, NullMatrix=NullMatrices[ii, :, :])
-
-            reference_points[:, ii] = obs.get_local_radius_point(
-                direction=dir0, in_global_frame=True
-            )
+        reference_points = self._get_surface_points_of_angles(
+            obs0, obs1, angles, NullMatrices
+        )
 
         delta_t = time.time() - t_start_graddescent
         print("Grad descent with dt={}s".format(delta_t))
@@ -629,6 +633,21 @@ class GradientContainer(ObstacleContainer):
                 reference_points[:, 1],
             )
 
+    def _get_surface_points_of_angles(self, obs0, obs1, angles, NullMatrices):
+        """Returns the surface points of shape (dimension, 2) of the two obstacles
+        in the direction of their (stacked) angles."""
+        dim = obs0.dim
+        surface_points = np.zeros((dim, 2))
+        for ii, obs in enumerate((obs0, obs1)):
+            direction = get_angle_space_inverse(
+                angles[ii * (dim - 1) : (ii + 1) * (dim - 1)],
+                NullMatrix=NullMatrices[ii, :, :],
+            )
+            surface_points[:, ii] = obs.get_local_radius_point(
+                direction=direction, in_global_frame=True
+            )
+        return surface_points
+
     def gamma_gradient_descent(
         self, obs0, obs1, common_point, convergence_err=1e-3, max_it=100
     ):
@@ -641,13 +660,11 @@ class GradientContainer(ObstacleContainer):
             delta_gamma = self.derivative_gamma_sum(common_point, obs0, obs1)
 
             # TODO: smart step size
-            common_point = common_point - step_size * delta_gamma
+            step = step_size * delta_gamma
+            common_point = common_point - step
             it_count += 1
 
-            if (
-                it_count > max_it
-                or np.linalg.norm(step_size * delta_gamma) < convergence_err
-            ):
+            if it_count > max_it or step.dot(step) < convergence_err * convergence_err:
                 break
 
         print(
@@ -668,45 +685,21 @@ class GradientContainer(ObstacleContainer):
         which lies strictly inside the obstacles."""
         dim = obs0.dim
 
-        derivative = np.zeros(dim)
-
-        for dd in range(dim):
-            delta = np.zeros(dim)
-            delta[dd] = delta_dist
-
-            gamma_high = obs0.get_gamma(
-                position + delta, in_global_frame=True, gamma_type=gamma_type
-            )
-
-            gamma_low = obs0.get_gamma(
-                position - delta, in_global_frame=True, gamma_type=gamma_type
-            )
-
-            delta_gamma = self.get_gamma_cost_function(
-                gamma_high
-            ) - self.get_gamma_cost_function(gamma_low)
-
-            # print('')
-            # print('gamma0_high', gamma_high, '--- gamma0_low', gamma_high)
-            # print('mean gamma', (gamma_high+gamma_low)/2.0)
-
-            gamma_high = obs1.get_gamma(
-                position + delta, in_global_frame=True, gamma_type=gamma_type
-            )
+        # Forward differences, i.e., [position, position + delta] evaluated at once
+        positions = np.tile(position, (dim + 1, 1)).T
+        positions[:, 1:] += delta_dist * np.eye(dim)
 
-            gamma_low = obs1.get_gamma(
-                position - delta, in_global_frame=True, gamma_type=gamma_type
-            )
-
-            delta_gamma += self.get_gamma_cost_function(
-                gamma_high, obs1.is_boundary
-            ) - self.get_gamma_cost_function(gamma_low, obs1.is_boundary)
-
-            derivative[dd] = (delta_gamma) / (2 * delta_dist)
+        gammas = obs0.get_gamma_batch(
+            positions, in_global_frame=True, gamma_type=gamma_type
+        )
+        costs = self.get_gamma_cost_function(gammas)
 
-            # print('mean boundary gamma', (gamma_high+gamma_low)/2.0)
+        gammas = obs1.get_gamma_batch(
+            positions, in_global_frame=True, gamma_type=gamma_type
+        )
+        costs += self.get_gamma_cost_function(gammas, obs1.is_boundary)
 
-        return derivative
+        return (costs[1:] - costs[0]) / delta_dist
 
     def get_gamma_cost_function(self, gamma, is_boundary=False, margin=1e-2):
         """This functions maps [0, 1] to [1, - infinity]
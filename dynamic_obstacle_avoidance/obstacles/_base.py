@@ -131,6 +131,10 @@ class Obstacle(ABC):
         else:
             self.pose = pose
 
+        # Orientation for which the (2D) rotation matrix was evaluated
+        self._rotation_matrix_orientation = None
+        self._rotation_matrix = None
+
         # Dimension of space
         if dimension is not None:
             self.dim = dimension
@@ -339,7 +343,16 @@ class Obstacle(ABC):
 
     @property
     def rotation_matrix(self):
-        return self.pose.rotation_matrix
+        orientation = self.pose.orientation
+        if orientation is None or self.dimension != 2:
+            return self.pose.rotation_matrix
+
+        # Only reevaluate when the obstacle has turned, since it is needed for every
+        # frame transformation
+        if orientation != getattr(self, "_rotation_matrix_orientation", None):
+            self._rotation_matrix = self.pose.rotation_matrix
+            self._rotation_matrix_orientation = orientation
+        return self._rotation_matrix
 
     @property
     def position(self):
@@ -615,6 +628,23 @@ class Obstacle(ABC):
     def get_gamma(self, position, with_reference_point_expansion=True):
         pass
 
+    def get_gamma_batch(
+        self, positions: np.ndarray, in_global_frame: bool = False, **kwargs
+    ) -> np.ndarray:
+        """Returns the gamma values of the positions of shape (dimension, n_points).
+        Evaluated point-wise; child-classes with a vectorized gamma override this."""
+        n_points = positions.shape[1]
+        return np.fromiter(
+            (
+                self.get_gamma(
+                    positions[:, ii], in_global_frame=in_global_frame, **kwargs
+                )
+                for ii in range(n_points)
+            ),
+            dtype=float,
+            count=n_points,
+        )
+
     def get_baundary_normal_direction(self, *args, **kwargs):
         return (-1) * self.get_normal_direction(*args, **kwargs)
 
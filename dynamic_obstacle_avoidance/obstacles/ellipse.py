@@ -7,7 +7,8 @@ import sys
 import copy
 import warnings
 import time
-from math import sin, cos, pi, ceil
+from functools import lru_cache
+from math import sin, cos, pi, ceil, sqrt
 
 import numpy as np
 from shapely.geometry.point import Point
@@ -16,13 +17,65 @@ from shapely import affinity
 import matplotlib.pyplot as plt  # TODO: remove for production
 
 from vartools.angle_math import *
-from vartools.angle_math import angle_modulo, angle_difference_directional_2pi
+from vartools.angle_math import angle_modulo
 from vartools.directional_space import get_directional_weighted_sum
 
 from dynamic_obstacle_avoidance.utils import *
 from dynamic_obstacle_avoidance.obstacles import Obstacle
 
 
+@lru_cache(maxsize=16)
+def _get_unit_boundary_points_2d(n_grid, power_0, power_1):
+    """Returns the drawing angles, their cosine and sine, and the boundary points
+    of an ellipse with unit axes. These only depend on the resolution and the
+    curvature, hence they are shared between frames (and obstacles)."""
+    theta = np.linspace(-pi, pi, num=n_grid)
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
+
+    if power_0 == power_1 == 2:
+        # Pure ellipse, i.e., the unit circle
+        boundary_points = np.vstack((cos_theta, sin_theta))
+    else:
+        boundary_points = np.vstack(
+            (
+                cos_theta,
+                np.copysign(1.0, theta) * (1 - cos_theta**power_0) ** (1.0 / power_1),
+            )
+        )
+
+    for array in (theta, cos_theta, sin_theta, boundary_points):
+        # The arrays are shared, hence they should not be modified
+        array.flags.writeable = False
+    return theta, cos_theta, sin_theta, boundary_points
+
+
+@lru_cache(maxsize=16)
+def _get_spherical_grid_3d(n_grid):
+    """Returns the drawing angles (theta, phi) of an ellipsoid and their cosine and
+    sine. Like the 2D points, they only depend on the resolution."""
+    theta, phi = np.meshgrid(
+        np.linspace(-pi, pi, num=n_grid),
+        np.linspace(-pi / 2, pi / 2, num=ceil(n_grid / 2)),
+    )
+    theta = theta.T
+    phi = phi.T
+
+    grids = (theta, phi, np.cos(theta), np.sin(theta), np.cos(phi), np.sin(phi))
+    for array in grids:
+        array.flags.writeable = False
+    return grids
+
+
+@lru_cache(maxsize=4)
+def _get_empty_edge_points(dim):
+    """Returns an edge-point array without any points, which is shared between
+    all obstacles of the same dimension."""
+    edge_points = np.zeros((dim, 0))
+    edge_points.flags.writeable = False
+    return edge_points
+
+
 class Ellipse(Obstacle):
     """Ellipse type obstacle
 
@@ -76,19 +129,16 @@ class Ellipse(Obstacle):
         self.is_convex = True
 
         # No go zone assuming a uniform margin around the obstacle
-        self.edge_margin_points = np.zeros((self.dim, 0))
+        self.edge_margin_points = _get_empty_edge_points(self.dim)
 
-        # Extended in case that the reference point is outside the obstacle
-        self.edge_reference_points = self.edge_margin_points
+        self.ind_edge_ref = 0
+        self.ind_edge_tang = 1
 
         # Extended in case that the reference point is outside the obstacle
         # 1st pair of points corresponds to 'extension' of reference point
         # 2nd pair of points are the tangent points on the ellipse
         self.edge_reference_points = self.edge_margin_points
 
-        self.ind_edge_ref = 0
-        self.ind_edge_tang = 1
-
         self.create_shapely()
 
     @property
@@ -98,6 +148,7 @@ class Ellipse(Obstacle):
     @axes_length.setter
     def axes_length(self, value):
         self._axes_length = value
+        self._update_axes_with_margin()
 
     @property
     def expansion_speed_axes(self):
@@ -119,15 +170,20 @@ class Ellipse(Obstacle):
 
     @property
     def p(self):  # TODO: remove
-        breakpoint()
-        warnings.warn("'p' is depreciated use 'curvature' instead")
+        self._warn_depreciated_p()
         return self._curvature
 
     @p.setter
     def p(self, value):  # TODO: remove
-        warnings.warn("'p' is depreciated use 'curvature' instead")
+        self._warn_depreciated_p()
         self.curvature = value
 
+    def _warn_depreciated_p(self):
+        # Only warn once per obstacle, since 'p' might be accessed in a loop
+        if not getattr(self, "_warned_depreciated_p", False):
+            warnings.warn("'p' is depreciated use 'curvature' instead")
+            self._warned_depreciated_p = True
+
     @property
     def curvature(self):
         return self._curvature
@@ -139,6 +195,9 @@ class Ellipse(Obstacle):
         else:
             self._curvature = value
 
+        # Pure ellipse (most common), for which the powers can be skipped
+        self._is_quadratic = bool(np.all(np.asarray(self._curvature) == 1))
+
     @property
     def margin_absolut(self):
         return self._margin_absolut
@@ -146,21 +205,70 @@ class Ellipse(Obstacle):
     @margin_absolut.setter
     def margin_absolut(self, value):
         self._margin_absolut = value
+        self._update_axes_with_margin()
+
+    @property
+    def is_boundary(self):
+        return self._is_boundary
+
+    @is_boundary.setter
+    def is_boundary(self, value):
+        self._is_boundary = value
+        self._update_axes_with_margin()
+
+    @property
+    def edge_reference_points(self):
+        return self._edge_reference_points
+
+    @edge_reference_points.setter
+    def edge_reference_points(self, value):
+        """Caches the tangents, hence the edge points should be reassigned
+        (not modified in place) when the reference point moves."""
+        self._edge_reference_points = value
+
+        if np.ndim(value) < 3:
+            # No tangents, since the reference point is inside
+            self._tangent_points = None
+            self._tangent_angles = None
+            self._tangent_arc_is_reflex = False
+            return
+
+        tangents = value[:, self.ind_edge_tang, :]
+        self._tangent_points = tangents
+        self._tangent_angles = np.arctan2(tangents[1, :], tangents[0, :])
+        # The arc between the tangents is larger than pi
+        self._tangent_arc_is_reflex = bool(
+            tangents[0, 0] * tangents[1, 1] - tangents[1, 0] * tangents[0, 1] < 0
+        )
 
     @property
     def axes_with_margin(self):
-        if self.is_boundary:
-            return self.axes_length - self.margin_absolut
+        return self._axes_with_margin
+
+    def _update_axes_with_margin(self):
+        """Caches the axes with margin (and their inverse), since they only change
+        with the axes, the margin or the boundary-flag."""
+        if (
+            getattr(self, "_axes_length", None) is None
+            or not hasattr(self, "_margin_absolut")
+            or not hasattr(self, "_is_boundary")
+        ):
+            # Not fully initialized yet
+            return
+
+        if self._is_boundary:
+            self._axes_with_margin = self._axes_length - self._margin_absolut
         else:
-            return self.axes_length + self.margin_absolut
+            self._axes_with_margin = self._axes_length + self._margin_absolut
+        self._inv_axes_with_margin = 1.0 / self._axes_with_margin
 
     def get_minimal_distance(self):
         """Minimal distance or minimal radius."""
-        return np.min(self.axes_length)
+        return self.axes_length.min()
 
     def get_maximal_distance(self):
-        """Minimal distance or maximal radius."""
-        return np.sqrt(np.sum(self.axes_length * 2))
+        """Maximal distance, i.e., the norm of the axes, which bounds the radius."""
+        return np.sqrt(self.axes_length.dot(self.axes_length))
 
     def get_characteristic_length(self):
         """Get a characeteric (or maximal) length of the obstacle.
@@ -170,38 +278,20 @@ class Ellipse(Obstacle):
     def get_reference_length(self):
         """Get a characeteric (or maximal) length of the obstacle.
         For an ellipse obstacle,the longest axes."""
-        return np.linalg.norm(self.axes_length) + self.margin_absolut
+        return np.sqrt(self.axes_length.dot(self.axes_length)) + self.margin_absolut
 
     def calculate_normalVectorAndDistance(self):
-        normal_vector = np.zeros((self.dim, self.n_planes))
-        normalDistance2center = np.zeros(self.n_planes)
-
-        if self.hull_with_respect_to_reference:
-            position = self.reference_point
-        else:
-            position = np.zeros(self.dim)
-
-        for ii in range(self.n_planes):
-            normal_vector[:, ii] = (
-                self.edge_reference_points[:, ii, 0]
-                - self.edge_reference_points[:, ii - 1, 1]
-            )
-
-            normal_vector[:, ii] = np.array(
-                [
-                    normal_vector[1, ii],
-                    -normal_vector[0, ii],
-                ]
-            )
-
-        for ii in range(self.n_planes):
-            normalDistance2center[ii] = normal_vector[:, ii].T.dot(
-                self.edge_reference_points[:, ii, 1]
-            )
+        # Edge from the (tangent) point of the previous plane to the reference point
+        edge_vector = self.edge_reference_points[:, :, 0] - np.roll(
+            self.edge_reference_points[:, :, 1], shift=1, axis=1
+        )
+        normal_vector = np.vstack((edge_vector[1, :], (-1) * edge_vector[0, :]))
 
-        normal_vector = normal_vector / np.tile(
-            np.linalg.norm(normal_vector, axis=0), (self.dim, 1)
+        normalDistance2center = np.einsum(
+            "ij,ij->j", normal_vector, self.edge_reference_points[:, :, 1]
         )
+
+        normal_vector /= np.linalg.norm(normal_vector, axis=0)
         return normal_vector, normalDistance2center
 
     def get_distance_to_hullEdge(self, position, hull_edge=None, in_global_frame=False):
@@ -216,52 +306,33 @@ class Ellipse(Obstacle):
             normal_vector, dist = self.calculate_normalVectorAndDistance(hull_edge)
 
         hull_edge = hull_edge.reshape(self.dim, -1)
-        n_planes = hull_edge.shape[1]
-        if len(hull_edge.shape) < 2:
-            vec_position2edge = np.tile(position - hull_edge, (n_planes, 1)).T
-        else:
-            vec_position2edge = np.tile(position, (n_planes, 1)).T - hull_edge
+        vec_position2edge = np.reshape(position, (self.dim, 1)) - hull_edge
 
-        distance2plane = np.sum((normal_vector * vec_position2edge), axis=0)
+        distance2plane = np.einsum("ij,ij->j", normal_vector, vec_position2edge)
 
         if False:
-            vec_position2edge = np.tile(position, (n_planes, 1)).T - self.tangent_points
+            vec_position2edge = position[:, np.newaxis] - self.tangent_points
             distance2plane = np.sum((self.normal_vector * vec_position2edge), axis=0)
 
         return distance2plane
 
     def position_is_in_direction_of_ellipse(self, position, in_global_frame=False):
+        """Checks if the position lies (counter-clockwise) between the two tangents,
+        i.e., if it is in the direction of the ellipse. Position can be a single
+        point or an array of shape (dimension, n_points)."""
         if in_global_frame:
             position = self.transform_global2relative(position)
 
-        mag_position = np.linalg.norm(position, axis=0)
-        position_dir = position / mag_position
+        tangent0 = self._tangent_points[:, 0]
+        tangent1 = self._tangent_points[:, 1]
 
-        angle_tangents = np.zeros(self.edge_reference_points.shape[2])
+        # Cross products (i.e. sine of the angles) to the two tangents
+        is_after_tangent0 = tangent0[0] * position[1] - tangent0[1] * position[0] >= 0
+        is_before_tangent1 = position[0] * tangent1[1] - position[1] * tangent1[0] >= 0
 
-        for ii in range(self.edge_reference_points.shape[2]):
-            angle_tangents[ii] = np.arctan2(
-                self.edge_reference_points[1, self.ind_edge_tang, ii],
-                self.edge_reference_points[0, self.ind_edge_tang, ii],
-            )
-
-        angle_position = np.arctan2(position[1], position[0])
-
-        angle_tang = angle_difference_directional_2pi(
-            angle_tangents[1], angle_tangents[0]
-        )
-        angle_pos_tang0 = angle_difference_directional_2pi(
-            angle_position, angle_tangents[0]
-        )
-        angle_tang1_pos = angle_difference_directional_2pi(
-            angle_tangents[1], angle_position
-        )
-
-        margin_subtraction = 1e-12
-
-        return (
-            abs(angle_tang - (angle_tang1_pos + angle_pos_tang0)) < margin_subtraction
-        )
+        if self._tangent_arc_is_reflex:
+            return np.logical_or(is_after_tangent0, is_before_tangent1)
+        return np.logical_and(is_after_tangent0, is_before_tangent1)
 
     def get_gamma(
         self,
@@ -277,7 +348,7 @@ class Ellipse(Obstacle):
 
         Parameters
         ----------
-        position: array like position of size (dimension,)
+        position: array like position of size (dimension,) or (dimension, n_points)
         in_global_frame: If position input is in global frame, transform to local frame
         gamma_type: Different types of the distance measure-evaluation
         inverted: Enforce normal / inverted evaluation (if None use the object / boundary default)
@@ -285,7 +356,7 @@ class Ellipse(Obstacle):
 
         Return
         ------
-        Gamma: distance value gamma of float
+        Gamma: distance value gamma of float (or array of size n_points)
         """
         if not gamma_type is None:
             # TODO: remove this before release (...)
@@ -304,6 +375,11 @@ class Ellipse(Obstacle):
 
             return Gamma
 
+        if np.ndim(position) > 1:
+            return self.get_gamma_batch(
+                position, in_global_frame=in_global_frame, relative_gamma=False
+            )
+
         if in_global_frame:
             position = self.pose.transform_position_to_relative(position)
 
@@ -316,9 +392,13 @@ class Ellipse(Obstacle):
                 warnings.warn("Implement linear gamma type.")
                 # raise Exception("Now it's enough")
 
-        Gamma = np.sum(
-            (np.abs(position) / self.axes_with_margin) ** (2 * self.curvature)
-        ) ** (1.0 / (2 * np.mean(self.curvature)))
+        if self._is_quadratic:
+            scaled_position = position * self._inv_axes_with_margin
+            Gamma = np.sqrt(scaled_position.dot(scaled_position))
+        else:
+            Gamma = np.sum(
+                (np.abs(position) * self._inv_axes_with_margin) ** (2 * self.curvature)
+            ) ** (1.0 / (2 * np.mean(self.curvature)))
 
         if self.is_boundary:
             Gamma = 1.0 / Gamma
@@ -326,6 +406,10 @@ class Ellipse(Obstacle):
 
     def get_normal_ellipse(self, position):
         """Return normal to ellipse surface"""
+        if self._is_quadratic:
+            inv_axes = self._inv_axes_with_margin
+            return 2 * position * (inv_axes * inv_axes)
+
         # return (2*self.curvature/self.axes_length*(position/self.axes_length)**(2*self.curvature-1))
         return (
             2
@@ -344,34 +428,39 @@ class Ellipse(Obstacle):
         n_planes = self.edge_reference_points.shape[1]
 
         vec_position2edge = (
-            np.tile(position, (n_planes, 1)).T - self.edge_reference_points[:, :, 0]
+            position[:, np.newaxis] - self.edge_reference_points[:, :, 0]
+        )
+        normalDistance2plane = np.einsum(
+            "ij,ij->j", self.normal_vector, vec_position2edge
         )
-        normalDistance2plane = np.sum((self.normal_vector * vec_position2edge), axis=0)
 
         angle2refencePatch = np.ones(n_planes) * max_angle
 
-        for ii in np.arange(n_planes)[normalDistance2plane > 0]:
-            # vec_position2edge[:, ii] /= np.linalg.norm(vec_position2edge[:, ii])
-
-            # cos_position2edge = vec_position2edge[:, ii].T.dot(self.tangent_vector[:,ii])
-            # angle2refencePatch[ii] = np.arccos(cos_position2edge)
+        ind_planes = normalDistance2plane > 0
+        if not np.any(ind_planes):
+            return angle2refencePatch
 
-            edge_points_temp = np.vstack(
-                (
-                    self.edge_reference_points[:, ii, 0],
-                    self.edge_reference_points[:, ii - 1, 1],
-                )
-            ).T
-            # Calculate angle to agent-position
-            ind_sort = np.argsort(
-                np.linalg.norm(np.tile(position, (2, 1)).T - edge_points_temp, axis=0)
-            )
-            tangent_line = (
-                edge_points_temp[:, ind_sort[1]] - edge_points_temp[:, ind_sort[0]]
-            )
+        # Edge points of all planes of shape (dimension, n_planes, 2)
+        edge_points = np.stack(
+            (
+                self.edge_reference_points[:, :, 0],
+                np.roll(self.edge_reference_points[:, :, 1], shift=1, axis=1),
+            ),
+            axis=2,
+        )[:, ind_planes, :]
+
+        # Calculate angle to agent-position
+        ind_near = np.argmin(
+            np.linalg.norm(position[:, np.newaxis, np.newaxis] - edge_points, axis=0),
+            axis=1,
+        )
+        it_planes = np.arange(edge_points.shape[1])
+        points_near = edge_points[:, it_planes, ind_near]
+        points_far = edge_points[:, it_planes, 1 - ind_near]
 
-            position_line = position - edge_points_temp[:, ind_sort[0]]
-            angle2refencePatch[ii] = self.get_angle2dir(position_line, tangent_line)
+        tangent_line = points_far - points_near
+        position_line = position[:, np.newaxis] - points_near
+        angle2refencePatch[ind_planes] = self.get_angle2dir(position_line, tangent_line)
 
         return angle2refencePatch
 
@@ -420,12 +509,74 @@ class Ellipse(Obstacle):
         if in_global_frame:
             normal_vector = self.transform_relative2global_dir(normal_vector)
 
-        mag_norm = LA.norm(normal_vector)
+        mag_norm = np.sqrt(normal_vector.dot(normal_vector))
         if mag_norm:
             normal_vector = normal_vector / mag_norm
 
         return normal_vector
 
+    def get_gamma_batch(
+        self, positions, in_global_frame=False, relative_gamma=True, **kwargs
+    ):
+        """Returns the gamma values of the positions of shape (dimension, n_points),
+        evaluated for all points at once."""
+        if relative_gamma and self.has_relative_gamma:
+            return super().get_gamma_batch(
+                positions, in_global_frame=in_global_frame, **kwargs
+            )
+
+        if in_global_frame:
+            positions = self.transform_global2relative(positions)
+
+        scaled_positions = positions * self._inv_axes_with_margin[:, np.newaxis]
+        if self._is_quadratic:
+            gammas = np.sqrt(np.einsum("ij,ij->j", scaled_positions, scaled_positions))
+        else:
+            curvature = np.reshape(self.curvature, (-1, 1))
+            gammas = np.sum(np.abs(scaled_positions) ** (2 * curvature), axis=0) ** (
+                1.0 / (2 * np.mean(self.curvature))
+            )
+
+        if self.is_boundary:
+            gammas = 1.0 / gammas
+        return gammas
+
+    def get_normal_direction_batch(self, positions, in_global_frame=False):
+        """Returns the normal directions at the positions of shape
+        (dimension, n_points). Only the points facing a reference patch are
+        evaluated one by one."""
+        if in_global_frame:
+            positions = self.transform_global2relative(positions)
+
+        if self.hull_with_respect_to_reference:
+            raise NotImplementedError(
+                "Everything needs to be with respect to reference."
+            )
+
+        inv_axes = self._inv_axes_with_margin[:, np.newaxis]
+        if self._is_quadratic:
+            normals = 2 * positions * (inv_axes * inv_axes)
+        else:
+            curvature = np.reshape(self.curvature, (-1, 1))
+            normals = (
+                2 * curvature * inv_axes * (positions * inv_axes) ** (2 * curvature - 1)
+            )
+
+        if not self.reference_point_is_inside:
+            ind_patch = np.logical_not(
+                self.position_is_in_direction_of_ellipse(positions)
+            )
+            for ii in np.flatnonzero(ind_patch):
+                normals[:, ii] = self.get_normal_direction(positions[:, ii])
+
+        if in_global_frame:
+            normals = self.transform_relative2global_dir(normals)
+
+        mag_norms = np.sqrt(np.einsum("ij,ij->j", normals, normals))
+        ind_nonzero = mag_norms > 0
+        normals[:, ind_nonzero] = normals[:, ind_nonzero] / mag_norms[ind_nonzero]
+        return normals
+
     def get_gamma_ellipse(
         self, position, in_global_frame=False, axes=None, curvature=None
     ):
@@ -438,6 +589,13 @@ class Ellipse(Obstacle):
         else:
             n_points = -1
 
+        if axes is None and curvature is None and self._is_quadratic:
+            if n_points > 0:
+                scaled_position = position * self._inv_axes_with_margin[:, np.newaxis]
+                return np.sqrt(np.einsum("ij,ij->j", scaled_position, scaled_position))
+            scaled_position = position * self._inv_axes_with_margin
+            return np.sqrt(scaled_position.dot(scaled_position))
+
         if axes is None:
             axes = self.axes_with_margin
 
@@ -458,15 +616,12 @@ class Ellipse(Obstacle):
             # return 1.0/rad_local
             return np.sqrt(
                 np.sum(
-                    (position / np.tile(axes, (n_points, 1)).T)
-                    ** np.tile(2 * curvature, (n_points, self.dim)).T,
-                    axis=0,
+                    (position / np.reshape(axes, (-1, 1))) ** (2 * curvature), axis=0
                 )
             )
 
         else:
-            norm_position = np.linalg.norm(position)
-            if norm_position == 0:
+            if not np.any(position):
                 return 0
             # rad_local = np.sqrt(1.0/np.sum(position/self.axes_with_margin**self.curvature) )
             # return 1.0/rad_local
@@ -478,8 +633,13 @@ class Ellipse(Obstacle):
                 angle_space = angle_space - self.orientation
                 # import pdb; pdb.set_trace() ## DEBUG ##
 
-            direction = np.array([np.cos(angle_space), np.sin(angle_space)])
-            direction_perp = np.array([-direction[1], direction[0]])
+            if np.isscalar(angle_space):
+                cos_angle, sin_angle = cos(angle_space), sin(angle_space)
+            else:
+                cos_angle, sin_angle = np.cos(angle_space), np.sin(angle_space)
+
+            direction = np.array([cos_angle, sin_angle])
+            direction_perp = np.array([-sin_angle, cos_angle])
 
         else:
             raise NotImplementedError("TODO for d>2")
@@ -489,7 +649,7 @@ class Ellipse(Obstacle):
             direction=direction, only_positive_direction=True
         )
 
-        local_radius = np.linalg.norm(local_radius, 2)
+        local_radius = np.hypot(local_radius[0], local_radius[1])
         derivative = direction_perp * local_radius - 0.5 * direction * (
             local_radius**3
         ) * self.get_radius_derivative_direction(angle_space)
@@ -499,13 +659,18 @@ class Ellipse(Obstacle):
         return derivative
 
     def get_radius_derivative_direction(self, angle_space):
-        axes = self.axes_with_margin
+        inv_axes = self._inv_axes_with_margin
         if self.dim == 2:
+            if np.isscalar(angle_space):
+                cos_angle, sin_angle = cos(angle_space), sin(angle_space)
+            else:
+                cos_angle, sin_angle = np.cos(angle_space), np.sin(angle_space)
+
             return (
                 2
-                * np.cos(angle_space)
-                * np.sin(angle_space)
-                * (-1.0 / (axes[0] * axes[0]) + 1.0 / (axes[1] * axes[1]))
+                * cos_angle
+                * sin_angle
+                * (inv_axes[1] * inv_axes[1] - inv_axes[0] * inv_axes[0])
             )
         else:
             raise NotImplementedError("Implement for d>2")
@@ -521,7 +686,7 @@ class Ellipse(Obstacle):
         if in_global_frame:
             position = self.transform_global2relative(position)
 
-        if not np.linalg.norm(position):  # zero vector
+        if not np.any(position):  # zero vector
             return np.zeros(position.shape)
 
         axes_backup = copy.deepcopy(self.axes_length)
@@ -579,8 +744,7 @@ class Ellipse(Obstacle):
             intersections = mag_x * direction
 
             if not only_positive_direction:
-                intersections = np.tile(intersections, (2, 1)).T
-                intersections[:, 1] = -intersections[:, 1]
+                intersections = np.stack((intersections, (-1) * intersections), axis=1)
 
             if in_global_frame:
                 intersections = self.transform_relative2global(intersections)
@@ -613,12 +777,14 @@ class Ellipse(Obstacle):
                 intersections[1, 1] = -axes[1]
 
         else:
-            m = direction[1] / direction[0]
-            c = edge_point[1] - m * edge_point[0]
+            # Evaluated on (python) floats, since it is called for single points
+            axes_0, axes_1 = float(axes[0]), float(axes[1])
+            m = float(direction[1]) / float(direction[0])
+            c = float(edge_point[1]) - m * float(edge_point[0])
 
-            A = (axes[0] * m) ** 2 + axes[1] ** 2
-            B = 2 * axes[0] ** 2 * m * c
-            C = (axes[0] * c) ** 2 - (axes[0] * axes[1]) ** 2
+            A = (axes_0 * m) ** 2 + axes_1**2
+            B = 2 * axes_0**2 * m * c
+            C = (axes_0 * c) ** 2 - (axes_0 * axes_1) ** 2
 
             D = B * B - 4 * A * C
 
@@ -627,26 +793,25 @@ class Ellipse(Obstacle):
                 warnings.warn("No intersection found.")
                 return
 
-            sqrtD = np.sqrt(D)
+            sqrtD = sqrt(D)
 
             if only_positive_direction:
-                intersections = np.zeros(self.dim)
-                intersections[0] = (-B + sqrtD) / (2 * A)
+                x_1 = (-B + sqrtD) / (2 * A)
 
-                if (intersections[0] - edge_point[0]) / direction[0] < 0:
-                    intersections[0] = (-B - sqrtD) / (2 * A)
-                intersections[1] = intersections[0] * m + c
+                if (x_1 - edge_point[0]) * direction[0] < 0:
+                    x_1 = (-B - sqrtD) / (2 * A)
+                intersections = np.array([x_1, x_1 * m + c])
 
             else:
-                intersections = np.zeros((self.dim, 2))
-                intersections[0, :] = np.array([(-B + sqrtD), (-B - sqrt(D))]) / (2 * A)
-                intersections[1, :] = intersections[0, :] * m + c
+                x_1 = np.array([(-B + sqrtD), (-B - sqrtD)]) / (2 * A)
+                intersections = np.vstack((x_1, x_1 * m + c))
                 # return intersections
 
         if not center_ellipse is None:
-            intersections = (
-                intersections + np.tile(center_ellipse, (intersections.shape[1], 1)).T
-            )
+            if intersections.ndim > 1:
+                intersections = intersections + center_ellipse[:, np.newaxis]
+            else:
+                intersections = intersections + center_ellipse
 
         if in_global_frame:
             intersections = self.transform_relative2global(intersections)
@@ -672,82 +837,103 @@ class Ellipse(Obstacle):
             relative_center, direction, only_positive_direction=True
         )
 
-        if relative_center is None:
-            dist = np.linalg.norm(intersection)
-        else:
-            dist = np.linalg.norm(intersection - relative_center)
-        return dist
+        # Intersection is evaluated in 2D only
+        return np.hypot(
+            intersection[0] - relative_center[0], intersection[1] - relative_center[1]
+        )
+
+    def _get_local_radius_ellipse_array(self, positions):
+        """Get radius of ellipse in direction of the positions of shape
+        (dimension, n_points) from the center."""
+        axes = self.axes_with_margin
+        pos_norm = np.linalg.norm(positions, axis=0)
+        scaled_norm = np.linalg.norm(positions / axes[:, np.newaxis], axis=0)
+
+        # Zero direction defaults to the second axis (as for the single point)
+        radius = np.full(positions.shape[1], axes[1], dtype=float)
+        ind_nonzero = pos_norm > 0
+        radius[ind_nonzero] = pos_norm[ind_nonzero] / scaled_norm[ind_nonzero]
+        return radius
 
     def get_local_radius_with_outside_reference(self, position: np.array) -> float:
         """Returns the local radius for case of reference point in the local frame
         everything happens in the local frame for a single position."""
         if self.position_is_in_direction_of_ellipse(position):
-            radius = self._get_local_radius_ellipse(position)
-        else:
-            angle_position = np.arctan2(position[1], position[0])
-
-            dist_intersect = -1
-            for ii, sign in zip(range(self.n_planes), [1, -1]):
-                angle_ref = np.arctan2(
-                    self.edge_reference_points[1, self.ind_edge_ref, ii],
-                    self.edge_reference_points[0, self.ind_edge_ref, ii],
-                )
-
-                if sign * angle_difference_directional(angle_ref, angle_position) >= 0:
-                    surface_dir = (
-                        self.edge_reference_points[:, self.ind_edge_ref, ii]
-                        - self.edge_reference_points[:, self.ind_edge_tang, 1 - ii]
-                    )
-
-                    dist_intersect, dist_tangent = np.linalg.lstsq(
-                        np.vstack((position[:], -surface_dir)).T,
-                        self.edge_reference_points[:, self.ind_edge_ref, ii],
-                        rcond=-1,
-                    )[0]
+            return self._get_local_radius_ellipse(position)
+        return self._get_local_radius_of_reference_patch(position)
+
+    def _get_local_radius_of_reference_patch(self, position: np.array) -> float:
+        """Returns the local radius of the position (local frame) which is not
+        in the direction of the ellipse, i.e., the radius of the reference patch.
+        Position can be a single point or an array of shape (dimension, n_points)."""
+        positions = np.reshape(position, (self.dim, -1))
+        n_points = positions.shape[1]
+
+        dist_intersect = np.full(n_points, -1.0)
+        for ii, sign in zip(range(self.n_planes), [1, -1]):
+            edge_ref = self.edge_reference_points[:, self.ind_edge_ref, ii]
+
+            # Side of the reference edge, i.e., the sign of the directional angle
+            # difference, evaluated with the cross-product instead of arctan2
+            ind_side = (
+                sign * (positions[0, :] * edge_ref[1] - positions[1, :] * edge_ref[0])
+                >= 0
+            )
+            if not np.any(ind_side):
+                continue
 
-                    dist_intersect = dist_intersect * np.linalg.norm(position[:])
+            surface_dir = (
+                edge_ref - self.edge_reference_points[:, self.ind_edge_tang, 1 - ii]
+            )
 
-            if dist_intersect < 0:  #
-                if not margin_absolut:
-                    raise ValueError("Negative value not possible.")
+            # Solve [position, -surface_dir] @ dist = edge_ref with Cramer's rule
+            points = positions[:, ind_side]
+            det = points[1, :] * surface_dir[0] - points[0, :] * surface_dir[1]
+
+            # Positions parallel to the surface have no intersection (dist < 0)
+            ind_regular = np.abs(det) >= 1e-12
+            dist = np.full(det.shape, -1.0)
+            dist[ind_regular] = (
+                (edge_ref[1] * surface_dir[0] - edge_ref[0] * surface_dir[1])
+                / det[ind_regular]
+                * np.hypot(points[0, ind_regular], points[1, ind_regular])
+            )
+            dist_intersect[ind_side] = dist
 
-                intersections = self.get_intersection_with_surface(
-                    edge_point=np.zeros(self.dim),
-                    direction=position[:],
-                    axes=np.ones(self.dim) * margin_absolut,
-                )
+        if np.any(dist_intersect < 0):
+            if not self.margin_absolut:
+                raise ValueError("Negative value not possible.")
 
-                # self.get_intersectionWithEllipse()
+            # Intersection with the margin-circle around the center
+            dist_intersect[dist_intersect < 0] = self.margin_absolut
 
-                distances = np.linalg.norm(intersections, axis=0)
-                dist_intersect = np.max(distances)
-            radius = dist_intersect
-        return radius
+        if np.ndim(position) == 1:
+            return dist_intersect[0]
+        return dist_intersect
 
     def _get_local_radius(self, position, relative_center=None):
+        """Returns the local radius of the positions of shape (dimension, n_points)."""
         # TODO: test for margin / reference point
-        # TODO: improve speed
-        if relative_center is None:
-            relative_center = np.zeros(self.dim)
-
-        # TODO: remove and make actual reference point
-        if relative_center is None:
-            relative_center = np.zeros(self.dimension)
-
-        margin_absolut = self.margin_absolut
         n_points = position.shape[1]
-        radius = np.zeros(position.shape[1])
+        radius = np.zeros(n_points)
 
         # Original Gamma
-        if self.dim == 2:
-            if self.reference_point_is_inside:
-                for pp in range(n_points):
-                    radius[pp] = self._get_local_radius_ellipse(position[:, pp])
-            else:
-                for pp in range(n_points):
-                    radius[pp] = self.get_local_radius_with_outside_reference(
-                        position[:, pp]
-                    )
+        if self.dim != 2:
+            return radius
+
+        if self.reference_point_is_inside:
+            return self._get_local_radius_ellipse_array(position)
+
+        in_direction = self.position_is_in_direction_of_ellipse(position)
+        radius[in_direction] = self._get_local_radius_ellipse_array(
+            position[:, in_direction]
+        )
+
+        # Remaining points are evaluated with respect to the reference patch
+        if not np.all(in_direction):
+            radius[~in_direction] = self._get_local_radius_of_reference_patch(
+                position[:, ~in_direction]
+            )
         return radius
 
     def create_shapely(self):
@@ -782,67 +968,63 @@ class Ellipse(Obstacle):
 
         if update_core_boundary_points:
             if self.dim == 2:
-                theta = np.linspace(-pi, pi, num=n_grid)
-                # resolution = n_grid # Resolution of drawing #points
-                boundary_points = np.zeros((self.dim, n_grid))
-                boundary_points[0, :] = a[0] * np.cos(theta)
-                boundary_points[1, :] = np.copysign(a[1], theta) * (
-                    1 - np.cos(theta) ** (2 * p[0])
-                ) ** (1.0 / (2.0 * p[1]))
-                self.boundary_points = boundary_points
+                (
+                    theta,
+                    cos_theta,
+                    sin_theta,
+                    unit_boundary_points,
+                ) = _get_unit_boundary_points_2d(
+                    n_grid, float(2 * p[0]), float(2.0 * p[1])
+                )
+                self.boundary_points = (
+                    np.reshape(a, (self.dim, 1)) * unit_boundary_points
+                )
 
             elif self.dim == 3:
-                n_grid = [n_grid, ceil(n_grid / 2)]
-                theta, phi = np.meshgrid(
-                    np.linspace(-pi, pi, num=n_grid[0]),
-                    np.linspace(-pi / 2, pi / 2, num=n_grid[1]),
-                )  #
-                n_grid = n_grid[0] * n_grid[1]
-                # resolution = n_grid # Resolution of drawing #points
-                theta = theta.T
-                phi = phi.T
+                (
+                    theta,
+                    phi,
+                    cos_theta,
+                    sin_theta,
+                    cos_phi,
+                    sin_phi,
+                ) = _get_spherical_grid_3d(n_grid)
+                n_grid = theta.size
 
                 boundary_points = np.zeros((self.dim, n_grid))
-                boundary_points[0, :] = (a[0] * np.cos(phi) * np.cos(theta)).reshape(
-                    (1, -1)
-                )
-                boundary_points[1, :] = (
-                    a[1]
-                    * np.copysign(1, theta)
-                    * np.cos(phi)
-                    * (1 - np.cos(theta) ** (2 * p[0])) ** (1.0 / (2.0 * p[1]))
-                ).reshape((1, -1))
-                boundary_points[2, :] = (
-                    a[2]
-                    * np.copysign(1, phi)
-                    * (
-                        1
-                        - (
-                            np.copysign(1, theta)
-                            * np.cos(phi)
-                            * (1 - 0 ** (2 * p[2]) - np.cos(theta) ** (2 * p[0]))
-                            ** (1 / (2 ** p[1]))
-                        )
-                        ** (2 * p[1])
-                        - (np.cos(phi) * np.cos(theta)) ** (2 * p[0])
+                boundary_points[0, :] = (a[0] * cos_phi * cos_theta).reshape((1, -1))
+
+                if self._is_quadratic:
+                    boundary_points[1, :] = (a[1] * cos_phi * sin_theta).reshape(
+                        (1, -1)
                     )
-                    ** (1 / (2 * p[2]))
-                ).reshape((1, -1))
+                    boundary_points[2, :] = (a[2] * sin_phi).reshape((1, -1))
+
+                else:
+                    two_p = 2.0 * np.asarray(p, dtype=float)
+                    # Shared terms of the y- and z-coordinate
+                    sin_theta_pow = 1 - cos_theta ** two_p[0]
+
+                    boundary_points[1, :] = (
+                        a[1]
+                        * np.copysign(cos_phi, theta)
+                        * sin_theta_pow ** (1.0 / two_p[1])
+                    ).reshape(-1)
+
+                    # Since |y / a1|^(2 p1) = cos(phi)^(2 p1) * sin_theta_pow
+                    sin_theta_pow *= cos_phi ** two_p[1]
+                    sin_theta_pow += (cos_phi * cos_theta) ** two_p[0]
+                    boundary_points[2, :] = (
+                        a[2] * np.copysign((1 - sin_theta_pow) ** (1 / two_p[2]), phi)
+                    ).reshape(-1)
                 self.boundary_points_local = boundary_points
 
             else:
                 raise NotImplementedError("Not yet implemented for dimension >3")
 
         if self.dim == 2:
-            boundary_points_margin = np.zeros((self.dim, 0))
             if not self.reference_point_is_inside:
-                angle_tangents = np.zeros(2)
-                for ii in range(angle_tangents.shape[0]):
-                    angle_tangents[ii] = np.arctan2(
-                        self.edge_reference_points[1, self.ind_edge_tang, ii],
-                        self.edge_reference_points[0, self.ind_edge_tang, ii],
-                    )
-                    # angle_tangents[ii] = np.arctan2(self.tangent_points[1, ii], self.tangent_points[0, ii])
+                angle_tangents = self._tangent_angles
                 if angle_tangents[0] < angle_tangents[1]:
                     theta = np.arange(
                         angle_tangents[0], angle_tangents[1], point_density
@@ -854,47 +1036,51 @@ class Ellipse(Obstacle):
                         point_density,
                     )
                     theta = angle_modulo(theta)
+                cos_theta, sin_theta = np.cos(theta), np.sin(theta)
 
             elif not self.margin_absolut:
                 # No boundary and reference point inside
                 self.boundary_points_margin_local = self.boundary_points
                 return
 
-            a = self.axes_with_margin
+            inv_axes = self._inv_axes_with_margin
 
             # Margin points
-            cos_theta, sin_theta = np.cos(theta), np.sin(theta)
-            power = 2 * self.curvature[0]
-            # try:
-            factor = 1.0 / (
-                (cos_theta / a[0]) ** power + (sin_theta / a[1]) ** power
-            ) ** (1.0 / power)
-            # except:
-            # breakpoint()
+            if self._is_quadratic and inv_axes[0] == inv_axes[1]:
+                # Circle
+                factor = 1.0 / inv_axes[0]
+            elif self._is_quadratic:
+                factor = 1.0 / np.hypot(
+                    cos_theta * inv_axes[0], sin_theta * inv_axes[1]
+                )
+            else:
+                # Evaluated in place to avoid temporaries
+                power = 2 * self.curvature[0]
+                factor = np.abs(cos_theta) * inv_axes[0]
+                factor **= power
+                scaled_sin = np.abs(sin_theta) * inv_axes[1]
+                scaled_sin **= power
+                factor += scaled_sin
+                factor **= (-1.0) / power
 
             if self.reference_point_is_inside:
-                boundary_points_margin = np.hstack(
-                    (
-                        boundary_points_margin,
-                        factor * np.vstack((cos_theta, sin_theta)),
-                    )
-                )
+                boundary_points_margin = np.empty((self.dim, theta.shape[0]))
+                it_theta = slice(None)
 
             else:
-                boundary_points_margin = np.hstack(
-                    (
-                        boundary_points_margin,
-                        np.reshape(
-                            self.edge_reference_points[:, self.ind_edge_ref, 1],
-                            (self.dim, 1),
-                        ),
-                        factor * np.vstack((cos_theta, sin_theta)),
-                        np.reshape(
-                            self.edge_reference_points[:, self.ind_edge_tang, 1],
-                            (self.dim, 1),
-                        ),
-                    )
-                )
+                # Enclosed by the reference edge and the tangent point
+                boundary_points_margin = np.empty((self.dim, theta.shape[0] + 2))
+                boundary_points_margin[:, 0] = self.edge_reference_points[
+                    :, self.ind_edge_ref, 1
+                ]
+                boundary_points_margin[:, -1] = self.edge_reference_points[
+                    :, self.ind_edge_tang, 1
+                ]
+                it_theta = slice(1, -1)
+
+            # Written directly into the margin array without temporaries
+            np.multiply(factor, cos_theta, out=boundary_points_margin[0, it_theta])
+            np.multiply(factor, sin_theta, out=boundary_points_margin[1, it_theta])
 
             self.boundary_points_margin_local = boundary_points_margin
 
@@ -941,18 +1127,20 @@ class Ellipse(Obstacle):
         return self.transform_relative2global(self._boundary_points_margin)
 
     def get_radius_of_angle(self, angle, in_global_frame=False):
-        """Extend the hull of non-boundary, convex obstacles such that the reference point lies in
-        inside the boundary again.
-        """
+        """Returns the radius of the ellipse (including the margin) in the direction
+        of the angle, evaluated in closed form."""
         if in_global_frame:
-            position = transform_polar2cartesian(
-                magnitude=10, angle=angle - self.orientation
-            )
-        else:
-            position = transform_polar2cartesian(magnitude=1, angle=angle)
+            angle = angle - self.orientation
+
+        # The angle is a scalar, hence math is faster than the numpy ufuncs
+        direction = np.array([cos(angle), sin(angle)])
+        scaled_direction = np.abs(direction) * self._inv_axes_with_margin
+        if self._is_quadratic:
+            return 1.0 / sqrt(scaled_direction.dot(scaled_direction))
 
-        gamma = self.get_gamma(position, gamma_type="proportional")
-        return np.linalg.norm(position) / gamma
+        return np.sum(scaled_direction ** (2 * self.curvature)) ** (
+            (-1.0) / (2 * np.mean(self.curvature))
+        )
 
     def extend_hull_around_reference(
         self, edge_reference_dist=0.3, relative_hull_margin=0.1
@@ -962,48 +1150,54 @@ class Ellipse(Obstacle):
         self.reference_point_is_inside = True  # Default assumption
 
         dist_max = self.get_maximal_distance() * relative_hull_margin
-        mag_ref_point = np.linalg.norm(self.reference_point)
-
-        if mag_ref_point:
-            reference_point_temp = self.reference_point * (1 + dist_max / mag_ref_point)
-            # gamma = self.get_gamma(reference_point_temp, np.zeros(self.dim))
-            gamma = self.get_gamma(reference_point_temp)
+        mag_ref_point = sqrt(self.reference_point.dot(self.reference_point))
 
-        if mag_ref_point and gamma > 1:
-            tt, tang_points = get_tangents2ellipse(
-                edge_point=reference_point_temp, axes=self.axes_with_margin
-            )
-
-            # tang_points[:, 0], tang_points[:, 1] = tang_points[:, 1], tang_points[:, 0]
-            tang_points = np.flip(tang_points, axis=1)
-            # = np.flip(tang_points, axis=1)
+        if not mag_ref_point:
+            # Reference point at the center is always inside
+            self.n_planes = 0
+            return
 
-            if np.cross(tang_points[:, 0], tang_points[:, 1]) > 0:  # TODO: remove
-                tang_points = np.flip(tang_points, axis=1)
-                warnings.warn("Had to flip. Reverse tangent order [1]<-->[0]! ")
+        reference_point_temp = self.reference_point * (1 + dist_max / mag_ref_point)
+        if self.get_gamma(reference_point_temp) <= 1:
+            self.n_planes = 0
+            return
 
-            self.edge_reference_points = np.zeros((self.dim, 2, 2))
-            self.edge_reference_points[:, self.ind_edge_ref, :] = np.tile(
-                reference_point_temp, (2, 1)
-            ).T
+        tt, tang_points = get_tangents2ellipse(
+            edge_point=reference_point_temp, axes=self.axes_with_margin
+        )
 
-            self.edge_reference_points[:, self.ind_edge_tang, :] = tang_points
+        # tang_points[:, 0], tang_points[:, 1] = tang_points[:, 1], tang_points[:, 0]
+        tang_points = np.flip(tang_points, axis=1)
+        # = np.flip(tang_points, axis=1)
 
-            self.reference_point_is_inside = False
-            self.n_planes = 2
-            (
-                self.normal_vector,
-                self.normalDistance2center,
-            ) = self.calculate_normalVectorAndDistance()
-
-            self.tangent_vector = np.zeros(self.normal_vector.shape)
-            for ii in range(self.normal_vector.shape[1]):
-                self.tangent_vector[:, ii] = [
-                    -self.normal_vector[1, ii],
-                    self.normal_vector[0, ii],
-                ]
-        else:
-            self.n_planes = 0
+        if (
+            tang_points[0, 0] * tang_points[1, 1]
+            - tang_points[1, 0] * tang_points[0, 1]
+            > 0
+        ):  # TODO: remove
+            tang_points = np.flip(tang_points, axis=1)
+            warnings.warn("Had to flip. Reverse tangent order [1]<-->[0]! ")
+
+        # Both pairs of points are filled below
+        edge_reference_points = np.empty((self.dim, 2, 2))
+        edge_reference_points[:, self.ind_edge_ref, :] = reference_point_temp[
+            :, np.newaxis
+        ]
+
+        edge_reference_points[:, self.ind_edge_tang, :] = tang_points
+        self.edge_reference_points = edge_reference_points
+
+        self.reference_point_is_inside = False
+        self.n_planes = 2
+        (
+            self.normal_vector,
+            self.normalDistance2center,
+        ) = self.calculate_normalVectorAndDistance()
+
+        # Normal vectors rotated by 90 degrees
+        self.tangent_vector = np.vstack(
+            ((-1) * self.normal_vector[1, :], self.normal_vector[0, :])
+        )
 
     def update_deforming_obstacle(self, delta_time):
         """Update step."""
@@ -1061,6 +1255,9 @@ class Sphere(Ellipse):
     def _get_local_radius(self, *args, **kwargs):
         return self.radius_with_margin
 
+    def get_radius_of_angle(self, angle, in_global_frame=False):
+        return self.radius_with_margin
+
     def get_deformation_velocity(self, position, in_global_frame=False):
         """Get relative velocity of a boundary point.
         This is zero if the deformation would be pulling."""
@@ -1068,7 +1265,7 @@ class Sphere(Ellipse):
         if in_global_frame:
             raise NotImplementedError()
 
-        norm_pos = np.linalg.norm(position)
+        norm_pos = sqrt(position.dot(position))
         if norm_pos:  # nonzero
             position = position / norm_pos
 
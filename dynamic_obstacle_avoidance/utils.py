@@ -8,7 +8,6 @@ import warnings
 from typing import Optional
 
 import numpy as np
-import numpy.linalg as LA
 import numpy.typing as npt
 
 from vartools.angle_math import *
@@ -56,69 +55,58 @@ def get_relative_obstacle_velocity(
     """
     n_obstacles = len(obstacle_list)
 
+    obs = obstacle_list
+
     if gamma_list is None:
-        gamma_list = np.zeros(n_obstacles)
-        for n in range(n_obstacles):
-            gamma_list[n] = obs[n].get_gamma(position, in_global_frame=True)
+        gamma_list = np.fromiter(
+            (
+                obs[n].get_gamma(position, in_global_frame=True)
+                for n in range(n_obstacles)
+            ),
+            dtype=float,
+            count=n_obstacles,
+        )
 
     if ind_obstacles is None:
+        # Far away obstacles (large gamma) have a negligible influence
         ind_obstacles = gamma_list < cut_off_gamma
         gamma_list = gamma_list[ind_obstacles]
 
-    obs = obstacle_list
-    ind_obs = ind_obstacles
+    it_obstacles = np.arange(n_obstacles)[ind_obstacles]
     dim = position.shape[0]
 
-    xd_obs = np.zeros((dim))
-    for ii, it_obs in zip(range(np.sum(ind_obs)), np.arange(n_obstacles)[ind_obs]):
-        if dim == 2:
-            if obs[it_obs].angular_velocity is None:
-                xd_w = np.zeros(dim)
-            else:
-                xd_w = np.cross(
-                    np.hstack(([0, 0], obs[it_obs].angular_velocity)),
-                    np.hstack((position - np.array(obs[it_obs].center_position), 0)),
-                )
-                xd_w = xd_w[0:2]
-        elif dim == 3:
-            if obs[it_obs].angular_velocity is not None and LA.norm(
-                obs[it_obs].angular_velocity
-            ):
-                xd_w = np.cross(
-                    obs[it_obs].angular_velocity,
-                    position - obs[it_obs].center_position,
-                )
-            else:
-                xd_w = np.zeros(dim)
-        else:
-            if obs[it_obs].angular_velocity is not None and LA.norm(
-                obs[it_obs].angular_velocity
-            ):
-                warnings.warn("Angular velocity is not defined for={}".format(d))
-            xd_w = np.zeros(dim)
-
-        weight_angular = np.exp(-1.0 * (np.max([gamma_list[ii], 1]) - 1))
-
-        linear_velocity = obs[it_obs].linear_velocity
-
-        if velocity_only_in_positive_normal_direction:
-            lin_vel_local = (E_orth[:, :, ii]).T.dot(obs[it_obs].linear_velocity)
-            if lin_vel_local[0] < 0 and not obs[it_obs].is_boundary:
-                # Obstacle is moving towards the agent
-                linear_velocity = np.zeros(lin_vel_local.shape[0])
-            else:
-                # For safety in close region, we multiply the velocity
-                lin_vel_local[0] = normal_weight_factor * lin_vel_local[0]
-                linear_velocity = E_orth[:, 0, ii].dot(lin_vel_local[0])
-
-            weight_linear = np.exp(-1 / 1 * (np.max([gamma_list[ii], 1]) - 1))
-        xd_obs_n = weight_linear * linear_velocity + weight_angular * xd_w
+    (
+        centers,
+        linear_velocities,
+        angular_velocities,
+        is_boundary,
+    ) = get_obstacle_state_arrays(obs, it_obstacles, dim=dim)
+
+    velocities = _get_rigid_obstacle_velocities(
+        position=position,
+        centers=centers,
+        linear_velocities=linear_velocities,
+        angular_velocities=angular_velocities,
+        is_boundary=is_boundary,
+        gamma_list=gamma_list,
+        E_orth=E_orth,
+        velocity_only_in_positive_normal_direction=velocity_only_in_positive_normal_direction,
+        normal_weight_factor=normal_weight_factor,
+    )
 
+    for ii, it_obs in enumerate(it_obstacles):
         # The Exponential term is very helpful as it help to avoid
         # the crazy rotation of the robot due to the rotation of the object
         if obs[it_obs].is_deforming:
-            weight_deform = np.exp(-1 / 1 * (np.max([gamma_list[ii], 1]) - 1))
-            vel_deformation = obs[it_obs].get_deformation_velocity(pos_relative[:, ii])
+            weight_deform = get_velocity_weights(gamma_list[ii])
+            # Evaluated in the local frame, since not all obstacles support the
+            # global one (e.g. the CircularObstacle)
+            vel_deformation = obs[it_obs].transform_relative2global_dir(
+                obs[it_obs].get_deformation_velocity(
+                    obs[it_obs].transform_global2relative(position),
+                    in_global_frame=False,
+                )
+            )
 
             if velocity_only_in_positive_normal_direction:
                 vel_deformation_local = E_orth[:, :, ii].T.dot(vel_deformation)
@@ -130,9 +118,139 @@ def get_relative_obstacle_velocity(
                 else:
                     vel_deformation = E_orth[:, 0, ii].dot(vel_deformation_local[0])
 
-            xd_obs_n += weight_deform * vel_deformation
-        xd_obs = xd_obs + xd_obs_n * weights[ii]
-    return xd_obs
+            velocities[:, ii] += weight_deform * vel_deformation
+
+    return velocities.dot(np.asarray(weights)[: it_obstacles.shape[0]])
+
+
+def get_obstacle_state_arrays(obstacle_list, it_obstacles=None, dim=None):
+    """Gathers the state of the obstacles in a single pass into arrays
+    (structure-of-arrays) with one column per obstacle.
+
+    Parameters
+    ----------
+    obstacle_list: list or <obstacle-conainter> with obstacles
+    it_obstacles: indices of the obstacles to consider (default: all)
+
+    Return
+    ------
+    centers: array of shape (dimension, n_obstacles)
+    linear_velocities: array of shape (dimension, n_obstacles)
+    angular_velocities: array of shape (1, n_obstacles) in 2D and of shape
+        (dimension, n_obstacles) otherwise
+    is_boundary: bool-array of shape (n_obstacles)
+    """
+    if it_obstacles is None:
+        it_obstacles = np.arange(len(obstacle_list))
+    if dim is None:
+        dim = obstacle_list[it_obstacles[0]].dimension
+
+    n_obs = len(it_obstacles)
+    centers = np.zeros((dim, n_obs))
+    linear_velocities = np.zeros((dim, n_obs))
+    angular_velocities = np.zeros((1 if dim == 2 else dim, n_obs))
+    is_boundary = np.zeros(n_obs, dtype=bool)
+
+    for ii, it_obs in enumerate(it_obstacles):
+        obs = obstacle_list[it_obs]
+        centers[:, ii] = obs.center_position
+        linear_velocities[:, ii] = obs.linear_velocity
+        is_boundary[ii] = obs.is_boundary
+
+        if obs.angular_velocity is None:
+            continue
+        if dim in (2, 3):
+            angular_velocities[:, ii] = obs.angular_velocity
+        elif np.any(obs.angular_velocity):
+            warnings.warn("Angular velocity is not defined for={}".format(dim))
+
+    return centers, linear_velocities, angular_velocities, is_boundary
+
+
+def get_velocity_weights(gamma_list):
+    """Exponential weight of the obstacle velocity, which is one on the obstacle
+    surface (gamma<=1) and decreases with increasing gamma."""
+    return np.exp((-1) * (np.maximum(gamma_list, 1) - 1))
+
+
+def _get_angular_velocities_2d(rel_positions, angular_velocities):
+    """Cross product of the (z-)rotation with the in-plane relative positions."""
+    return np.vstack(
+        (
+            (-1) * angular_velocities[0, :] * rel_positions[1, :],
+            angular_velocities[0, :] * rel_positions[0, :],
+        )
+    )
+
+
+def _get_angular_velocities_3d(rel_positions, angular_velocities):
+    """Column-wise cross product of angular velocities and relative positions."""
+    w_x, w_y, w_z = angular_velocities
+    r_x, r_y, r_z = rel_positions
+    return np.vstack(
+        (w_y * r_z - w_z * r_y, w_z * r_x - w_x * r_z, w_x * r_y - w_y * r_x)
+    )
+
+
+def _get_rigid_obstacle_velocities(
+    position: np.ndarray,
+    centers: np.ndarray,
+    linear_velocities: np.ndarray,
+    angular_velocities: np.ndarray,
+    is_boundary: np.ndarray,
+    gamma_list: np.ndarray,
+    E_orth: np.ndarray,
+    velocity_only_in_positive_normal_direction: bool = True,
+    normal_weight_factor: float = 1.3,
+) -> np.ndarray:
+    """Returns the (gamma-weighted) velocities of shape (dimension, n_obstacles)
+    due to linear and angular motion of the obstacles.
+
+    The obstacle states are passed as arrays with one column per obstacle;
+    the angular velocities are of shape (1, n_obstacles) in 2D and of shape
+    (3, n_obstacles) in 3D."""
+    dim = position.shape[0]
+
+    n_obs = centers.shape[1]
+    E_orth = E_orth[:, :, :n_obs]
+
+    # Same (exponential) weight for linear and angular velocity of each obstacle
+    gamma_list = np.asarray(gamma_list)[:n_obs]
+    weights_velocity = get_velocity_weights(gamma_list)
+
+    rel_positions = position[:, np.newaxis] - centers
+    if dim == 2:
+        xd_w = _get_angular_velocities_2d(rel_positions, angular_velocities)
+    elif dim == 3:
+        xd_w = _get_angular_velocities_3d(rel_positions, angular_velocities)
+    else:
+        xd_w = np.zeros((dim, n_obs))
+
+    if velocity_only_in_positive_normal_direction:
+        # Only the normal component of the velocity in the (local) basis of each
+        # obstacle is needed
+        if dim == 2:
+            normal_velocities = (
+                E_orth[0, 0, :] * linear_velocities[0, :]
+                + E_orth[1, 0, :] * linear_velocities[1, :]
+            )
+        else:
+            normal_velocities = np.einsum(
+                "ki,ki->i", E_orth[:, 0, :], linear_velocities
+            )
+
+        # Obstacles moving towards the agent are not considered; for safety in
+        # close region, we multiply the (normal) velocity
+        normal_velocities[
+            np.logical_and(normal_velocities < 0, np.logical_not(is_boundary))
+        ] = 0
+        normal_velocities *= normal_weight_factor
+        linear_velocities = E_orth[:, 0, :] * normal_velocities
+
+    # Sum and weight in-place (xd_w is a new array in any case)
+    xd_w += linear_velocities
+    xd_w *= weights_velocity
+    return xd_w
 
 
 def get_weight_from_gamma(*args, **kwargs):
@@ -155,18 +273,11 @@ def get_weight_gamma(gamma_array: np.ndarray, power_value: float = 1.0) -> np.nd
 
 
 def getGammmaValue_ellipsoid(ob, x_t, relativeDistance=True):
-    if relativeDistance:
-        return np.sum(
-            (x_t / np.tile(ob.a, (x_t.shape[1], 1)).T)
-            ** (2 * np.tile(ob.p, (x_t.shape[1], 1)).T),
-            axis=0,
-        )
-    else:
-        return np.sum(
-            (x_t / np.tile(ob.a, (x_t.shape[1], 1)).T)
-            ** (2 * np.tile(ob.p, (x_t.shape[1], 1)).T),
-            axis=0,
-        )
+    """Gamma value of the points x_t of shape (dim, N) in the ellipse frame.
+    Both distance types have the same (relative) value."""
+    axes = np.asarray(ob.a)[:, np.newaxis]
+    powers = 2 * np.asarray(ob.p)[:, np.newaxis]
+    return np.sum((x_t / axes) ** powers, axis=0)
 
 
 def get_radius_ellipsoid(x_t, a=[], ob=[]):
@@ -195,7 +306,8 @@ def get_radius(vec_point2ref, vec_cent2ref=[], a=[], obs=[]):
         vec_cent2ref = np.array(obs.rotMatrix).T.dot(vec_cent2ref)
         vec_point2ref = np.array(obs.rotMatrix).T.dot(vec_point2ref)
 
-    if not LA.norm(vec_cent2ref):  # center = ref
+    dist_cent2ref = np.hypot(vec_cent2ref[0], vec_cent2ref[1])
+    if not dist_cent2ref:  # center = ref
         return get_radius_ellipsoid(vec_point2ref, a)
 
     dir_surf_cone = np.zeros((dim, 2))
@@ -205,24 +317,19 @@ def get_radius(vec_point2ref, vec_cent2ref=[], a=[], obs=[]):
         # 2D vectors pointing in opposite direction
         dir_surf_cone[:, 0] = vec_cent2ref
         rad_surf_cone[0] = np.abs(
-            get_radius_ellipsoid(dir_surf_cone[:, 0], a) - LA.norm(vec_cent2ref)
+            get_radius_ellipsoid(dir_surf_cone[:, 0], a) - dist_cent2ref
         )
 
         dir_surf_cone[:, 1] = -1 * np.array(vec_cent2ref)
-        rad_surf_cone[1] = get_radius_ellipsoid(dir_surf_cone[:, 1], a) + LA.norm(
-            vec_cent2ref
-        )
+        rad_surf_cone[1] = get_radius_ellipsoid(dir_surf_cone[:, 1], a) + dist_cent2ref
 
     else:
         dir_surf_cone[:, 0] = -1 * np.array(vec_cent2ref)
-
-        rad_surf_cone[0] = get_radius_ellipsoid(dir_surf_cone[:, 0], a) + LA.norm(
-            vec_cent2ref
-        )
+        rad_surf_cone[0] = get_radius_ellipsoid(dir_surf_cone[:, 0], a) + dist_cent2ref
 
         dir_surf_cone[:, 1] = vec_cent2ref
         rad_surf_cone[1] = np.abs(
-            get_radius_ellipsoid(dir_surf_cone[:, 1], a) - LA.norm(vec_cent2ref)
+            get_radius_ellipsoid(dir_surf_cone[:, 1], a) - dist_cent2ref
         )
 
     # color_set = ['g', 'r']
@@ -230,44 +337,36 @@ def get_radius(vec_point2ref, vec_cent2ref=[], a=[], obs=[]):
     # plt.plot([obs.center_dyn[0], obs.center_dyn[0]+dir_surf_cone[0,i]], [obs.center_dyn[1], obs.center_dyn[1]+dir_surf_cone[1,i]], color_set[i])
     # plt.show()
 
+    # Bisection on the angle; the (2D) rotations, cross products and norms are
+    # evaluated on scalars to avoid creating small arrays in every iteration
+    vec_cent2ref = np.asarray(vec_cent2ref, dtype=float)
     ang_tot = np.pi / 2
     for ii in range(12):  # n_iter
-        rotMat = np.array(
-            [
-                [np.cos(ang_tot), np.sin(ang_tot)],
-                [-np.sin(ang_tot), np.cos(ang_tot)],
-            ]
-        )
+        cos_ang = np.cos(ang_tot)
+        sin_ang = np.sin(ang_tot)
+        dir_x = cos_ang * dir_surf_cone[0, 0] + sin_ang * dir_surf_cone[1, 0]
+        dir_y = (-1) * sin_ang * dir_surf_cone[0, 0] + cos_ang * dir_surf_cone[1, 0]
 
-        # vec_ref2dir = rotMat @ dir_surf_cone[:, 0]
-        # vec_ref2dir /= LA.norm(vec_ref2dir) # nonzero value expected
-        # rad_ref2 = get_radius_ellipsoid(vec_ref2dir, a)
-        # vec_ref2surf = rad_ref2*vec_ref2dir - vec_cent2ref
+        # Nonzero value expected
+        dir_norm = np.hypot(dir_x, dir_y)
+        vec_cent2dir = np.array([dir_x / dir_norm, dir_y / dir_norm])
 
-        vec_cent2dir = rotMat.dot(dir_surf_cone[:, 0])
-        vec_cent2dir /= LA.norm(vec_cent2dir)  # nonzero value expected
         rad_ref2 = get_radius_ellipsoid(vec_cent2dir, a)
-        vec_ref2surf = rad_ref2 * vec_cent2dir - vec_cent2ref
+        surf_x = rad_ref2 * vec_cent2dir[0] - vec_cent2ref[0]
+        surf_y = rad_ref2 * vec_cent2dir[1] - vec_cent2ref[1]
 
-        crossProd = np.cross(vec_ref2surf, vec_point2ref)
+        crossProd = surf_x * vec_point2ref[1] - surf_y * vec_point2ref[0]
         if crossProd < 0:
-            # dir_surf_cone[:, 0] = vec_ref2dir
             dir_surf_cone[:, 0] = vec_cent2dir
-            rad_surf_cone[0] = LA.norm(vec_ref2surf)
+            rad_surf_cone[0] = np.hypot(surf_x, surf_y)
         elif crossProd == 0:  # how likely is this lucky guess?
-            return LA.norm(vec_ref2surf)
+            return np.hypot(surf_x, surf_y)
         else:
-            # dir_surf_cone[:, 1] = vec_ref2dir
             dir_surf_cone[:, 1] = vec_cent2dir
-            rad_surf_cone[1] = LA.norm(vec_ref2surf)
+            rad_surf_cone[1] = np.hypot(surf_x, surf_y)
 
         ang_tot /= 2.0
 
-        # vec_transp = np.array(obs.rotMatrix).dot(vec_ref2surf)
-        # plt.plot([obs.center_dyn[0], obs.center_dyn[0]+vec_transp[0]],[obs.center_dyn[1], obs.center_dyn[1]+vec_transp[1]], 'b')
-        # plt.show()
-        # import pdb; pdb.set_trace() ## DEBUG ##
-
     return np.mean(rad_surf_cone)
 
 
@@ -276,6 +375,10 @@ def findRadius(ob, direction, a=[], repetition=6, steps=10):
     # TODO check
     if not len(a):
         a = [np.min(ob.a), np.max(ob.a)]
+    else:
+        a = list(a)
+
+    direction = np.reshape(direction, (-1, 1))
 
     # repetition
     for ii in range(repetition):
@@ -283,38 +386,32 @@ def findRadius(ob, direction, a=[], repetition=6, steps=10):
             return a[0]
 
         magnitudeDir = np.linspace(a[0], a[1], num=steps)
-        Gamma = getGammmaValue_ellipsoid(
-            ob,
-            np.tile(direction, (steps, 1)).T
-            * np.tile(magnitudeDir, (np.array(ob.x0).shape[0], 1)),
-        )
+        Gamma = getGammmaValue_ellipsoid(ob, direction * magnitudeDir)
 
         if np.sum(Gamma == 1):
             return magnitudeDir[np.where(Gamma == 1)]
-        posBoundary = np.where(Gamma < 1)[0][-1]
-
-        a[0] = magnitudeDir[posBoundary]
-        posBoundary += 1
-        while Gamma[posBoundary] <= 1:
-            posBoundary += 1
 
-        a[1] = magnitudeDir[posBoundary]
+        # Gamma is increasing along the direction; the boundary lies between the
+        # last point inside and the first point outside (clipped to the interval)
+        n_inside = np.sum(Gamma < 1)
+        a[0] = magnitudeDir[max(n_inside - 1, 0)]
+        a[1] = magnitudeDir[min(n_inside, steps - 1)]
 
     return (a[0] + a[1]) / 2.0
 
 
 def findBoundaryPoint(ob, direction):
     # Numerical search -- TODO analytic
-    dirNorm = LA.norm(direction, 2)
+    dirNorm = np.sqrt(np.dot(direction, direction))
     if dirNorm:
         direction = direction / dirNorm
     else:
         print("No feasible direction is given")
         return ob.x0
 
-    a = [np.min(x0.a), np.max(x0.a)]
+    a = [np.min(ob.a), np.max(ob.a)]
 
-    return (a[0] + a[1]) / 2.0 * direction + x0
+    return (a[0] + a[1]) / 2.0 * direction + ob.x0
 
 
 def compute_eigenvalueMatrix(Gamma, rho=1, dim=2, radialContuinity=True):
@@ -337,69 +434,57 @@ def compute_weights(
 ) -> np.ndarray:
     """Compute weights based on a distance measure (with no upper limit)"""
     distMeas = np.array(distMeas)
-    n_points = distMeas.shape[0]
 
     critical_points = distMeas <= distMeas_lowerLimit
+    n_critical = np.count_nonzero(critical_points)
 
-    if np.sum(critical_points):  # at least one
-        if np.sum(critical_points) == 1:
+    if n_critical:  # at least one
+        if n_critical == 1:
             w = critical_points * 1.0
             return w
         else:
             # TODO: continuous weighting function
             warnings.warn("Implement continuity of weighting function.")
-            w = critical_points * 1.0 / np.sum(critical_points)
+            w = critical_points * (1.0 / n_critical)
             return w
 
     distMeas = distMeas - distMeas_lowerLimit
-    w = (1 / distMeas) ** weightPow
-    if np.sum(w) == 0:
+    if weightPow == 1:
+        w = 1.0 / distMeas
+    elif weightPow == 2:
+        w = 1.0 / (distMeas * distMeas)
+    else:
+        w = (1 / distMeas) ** weightPow
+
+    w_sum = np.sum(w)
+    if w_sum == 0:
         return w
 
-    w = w / np.sum(w)  # Normalization
+    w = w / w_sum  # Normalization
 
     return w
 
 
 def compute_R(d, th_r):
     warnings.warn("This function will be removed. Don't use it")
-    if th_r == 0:
-        rotMatrix = np.eye(d)
+    if not np.any(th_r):
+        return np.eye(d)
+
     # rotating the query point into the obstacle frame of reference
     if d == 2:
-        rotMatrix = np.array(
-            [[np.cos(th_r), -np.sin(th_r)], [np.sin(th_r), np.cos(th_r)]]
-        )
+        cos_r, sin_r = np.cos(th_r), np.sin(th_r)
+        rotMatrix = np.array([[cos_r, -sin_r], [sin_r, cos_r]])
     elif d == 3:
-        R_x = np.array(
-            [
-                [
-                    1,
-                    0,
-                    0,
-                ],
-                [0, np.cos(th_r[0]), np.sin(th_r[0])],
-                [0, -np.sin(th_r[0]), np.cos(th_r[0])],
-            ]
-        )
-
-        R_y = np.array(
-            [
-                [np.cos(th_r[1]), 0, -np.sin(th_r[1])],
-                [0, 1, 0],
-                [np.sin(th_r[1]), 0, np.cos(th_r[1])],
-            ]
-        )
-
-        R_z = np.array(
+        # Closed form of the product R_x(th_r[0]) * R_y(th_r[1]) * R_z(th_r[2])
+        c0, c1, c2 = np.cos(th_r)
+        s0, s1, s2 = np.sin(th_r)
+        rotMatrix = np.array(
             [
-                [np.cos(th_r[2]), np.sin(th_r[2]), 0],
-                [-np.sin(th_r[2]), np.cos(th_r[2]), 0],
-                [0, 0, 1],
+                [c1 * c2, c1 * s2, -s1],
+                [s0 * s1 * c2 - c0 * s2, s0 * s1 * s2 + c0 * c2, s0 * c1],
+                [c0 * s1 * c2 + s0 * s2, c0 * s1 * s2 - s0 * c2, c0 * c1],
             ]
         )
-
-        rotMatrix = R_x.dot(R_y).dot(R_z)
     else:
         warnings.warn("rotation not yet defined in dimensions d > 3 !")
         rotMatrix = np.eye(d)
@@ -422,75 +507,20 @@ def obs_check_collision_2d(obs_list, XX, YY):
     if not len(obs_list):
         return np.ones((dim_points))
 
-    points = np.array(([np.reshape(XX, (N_points,)), np.reshape(YY, (N_points,))]))
-    # At the moment only implemented for 2D
-    collision = np.zeros(dim_points)
-
-    N_points = points.shape[1]
-
-    noColl = np.ones((1, N_points), dtype=bool)
+    points = np.vstack((np.reshape(XX, (N_points,)), np.reshape(YY, (N_points,))))
 
-    for it_obs in range(len(obs_list)):
-        Gamma = np.zeros(N_points)
-        for ii in range(N_points):
-            Gamma[ii] = obs_list[it_obs].get_gamma(points[:, ii], in_global_frame=True)
-
-        noColl = noColl * Gamma > 1
+    noColl = np.ones(N_points, dtype=bool)
+    for obs in obs_list:
+        # Points which already collided do not need to be evaluated again
+        ind_free = np.flatnonzero(noColl)
+        if not ind_free.shape[0]:
+            break
+        gammas = obs.get_gamma_batch(points[:, ind_free], in_global_frame=True)
+        noColl[ind_free] = gammas > 1
 
     return np.reshape(noColl, dim_points)
 
 
-def obs_check_collision(obs_list, dim, *args):
-    """Check if points (as a list in *args) are colliding with any of the
-    obstacles."""
-    # No obstacles
-    if len(obs_list) == 0:
-        return np.ones(args[0].shape)
-
-    dim = obs_list[0].dim
-
-    if len(*args) == dim:
-        points = np.array([])
-        for ii in range(dim):
-            input_shape = args[0].shape
-            points = np.vstack((points, np.arary(args[ii]).flatten()))
-
-    N_points = points.shape[1]
-
-    # At the moment only implemented for 2D
-    collision = np.zeros((N_points))
-
-    for ii in range(N_points):
-        pass
-    import pdb
-
-    pdb.set_trace()
-    return noColl
-
-
-def obs_check_collision_ellipse(obs_list, dim, points):
-    warnings.warn("Depreciated --- delete this function ")
-    # TODO: delete / depreciated
-    for it_obs in range(len(obs_list)):
-        # \Gamma = \sum_{i=1}^d (xt_i/a_i)^(2p_i) = 1
-        R = compute_R(dim, obs_list[it_obs].th_r)
-
-        Gamma = sum(
-            (
-                1
-                / obs_list[it_obs].sf
-                * R.T.dot(
-                    points - np.tile(np.array([obs_list[it_obs].x0]).T, (1, N_points))
-                )
-                / np.tile(np.array([obs_list[it_obs].a]).T, (1, N_points))
-            )
-            ** (np.tile(2 * np.array([obs_list[it_obs].p]).T, (1, N_points)))
-        )
-
-        noColl = noColl * Gamma > 1
-    return noColl
-
-
 def get_tangents2ellipse(edge_point, axes, center_point=None, dim=2):
     """
     Get 2D tangent vector of ellipse with axes <<axes>> and center <<center_point>>
@@ -518,46 +548,34 @@ def get_tangents2ellipse(edge_point, axes, center_point=None, dim=2):
         # print(axes)
         raise RuntimeError("Invalid value for D_<0 (D_={})".format(D_))
 
-    m = np.zeros(2)
+    # Slopes of both tangents
+    sqrt_D = np.sqrt(D_)
+    m = np.array([-B_ + sqrt_D, -B_ - sqrt_D]) / (2 * A_)
+    c = edge_point[1] - m * edge_point[0]
 
-    m[1] = (-B_ - np.sqrt(D_)) / (2 * A_)
-    m[0] = (-B_ + np.sqrt(D_)) / (2 * A_)
+    A = (axes[0] * m) ** 2 + axes[1] ** 2
+    B = 2 * axes[0] ** 2 * m * c
+    # D != 0 to be tangent, so C not interesting.
 
     tangent_points = np.zeros((dim, 2))
-    tangent_vectors = np.zeros((dim, 2))
-    tangent_angles = np.zeros(2)
+    tangent_points[0, :] = -B / (2 * A)
+    tangent_points[1, :] = m * tangent_points[0, :] + c
 
-    for ii in range(2):
-        c = edge_point[1] - m[ii] * edge_point[0]
+    tangent_vectors = tangent_points - np.reshape(edge_point, (dim, 1))
+    tangent_vectors /= np.hypot(tangent_vectors[0, :], tangent_vectors[1, :])
 
-        A = (axes[0] * m[ii]) ** 2 + axes[1] ** 2
-        B = 2 * axes[0] ** 2 * m[ii] * c
-        # D != 0 to be tangent, so C not interesting.
-
-        tangent_points[0, ii] = -B / (2 * A)
-        tangent_points[1, ii] = m[ii] * tangent_points[0, ii] + c
-
-        tangent_vectors[:, ii] = tangent_points[:, ii] - edge_point
-        tangent_vectors[:, ii] /= LA.norm(tangent_vectors[:, ii])
-
-        # normal_vectors[:, ii] = np.array([tangent_vectors[1,ii], -tangent_vectors[0,ii]])
-
-        # Check direction
-        # normalDistance2center[ii] = normal_vectors[:, ii].T.dot(edge_point)
-
-        # if (normalDistance2center[ii] < 0):
-        # normal_vectors[:, ii] = normal_vectors[:, ii]*(-1)
-        # normalDistance2center[ii] *= -1
-        tangent_angles[ii] = np.arctan2(tangent_points[1, ii], tangent_points[0, ii])
-
-    if angle_difference_directional(tangent_angles[1], tangent_angles[0]) < 0:
+    # Sort the tangent points in positive direction around the center, i.e.
+    # the (directional) angle from the first to the second point is positive
+    cross_prod = (
+        tangent_points[0, 0] * tangent_points[1, 1]
+        - tangent_points[1, 0] * tangent_points[0, 1]
+    )
+    if cross_prod < 0:
         tangent_points = np.flip(tangent_points, axis=1)
         tangent_vectors = np.flip(tangent_vectors, axis=1)
 
     if not center_point is None:
-        tangent_points = (
-            tangent_points + np.tile(center_point, (tangent_points.shape[1], 1)).T
-        )
+        tangent_points = tangent_points + np.reshape(center_point, (dim, 1))
 
     return tangent_vectors, tangent_points
 
@@ -575,33 +593,33 @@ def get_reference_weight(
     # weights = get_inverse_proprtional_weight(distance, distance_min, distance_max, weight_pow)
     weights_all = np.zeros(distance.shape)
 
-    # if False:
-    if any(np.logical_and(distance <= distance_min, distance > 0)):
+    if np.any((distance <= distance_min) & (distance > 0)):
         ind0 = distance == 0
         weights_all[ind0] = 1 / np.sum(ind0)
         return weights_all
 
-    # print('distance_max', distance_max)
-    ind_range = np.logical_and(distance > distance_min, distance < distance_max)
-    if not any(ind_range):
+    ind_range = (distance > distance_min) & (distance < distance_max)
+    if not np.any(ind_range):
         return weights_all
 
-    dist_temp = distance[ind_range]
-    weights = 1 / (dist_temp - distance_min) - 1 / (distance_max - distance_min)
-    weights = weights**weight_pow
+    # Shifted distance, it is reused (in-place) for the reference displacement
+    dist_temp = distance[ind_range] - distance_min
+    weights = 1 / dist_temp
+    weights -= 1 / (distance_max - distance_min)
+    if weight_pow != 1:
+        weights **= weight_pow
 
     # Normalize
-    weights = weights / np.sum(weights)
+    weights /= np.sum(weights)
 
     # Add amount of movement relative to distance
     if not obs_reference_size is None:
         distance_max = distance_max * obs_reference_size[ind_range]
 
-    weight_ref_displacement = 1 / (dist_temp + 1 - distance_min) - 1 / (
-        distance_max + 1 - distance_min
-    )
+    dist_temp += 1
+    weights *= 1 / dist_temp - 1 / (distance_max + 1 - distance_min)
 
-    weights_all[ind_range] = weights * weight_ref_displacement
+    weights_all[ind_range] = weights
 
     return weights_all
 
@@ -39,16 +39,10 @@ def gamma_field_visualization(
     x_vals = np.linspace(x_lim[0], x_lim[1], n_resolution)
     y_vals = np.linspace(y_lim[0], y_lim[1], n_resolution)
 
-    gamma_values = np.zeros((n_resolution, n_resolution))
-    positions = np.zeros((dim, n_resolution, n_resolution))
-
-    for ix in range(n_resolution):
-        for iy in range(n_resolution):
-            positions[:, ix, iy] = [x_vals[ix], y_vals[iy]]
-
-            gamma_values[ix, iy] = obstacle.get_gamma(
-                positions[:, ix, iy], in_global_frame=True
-            )
+    positions = np.array(np.meshgrid(x_vals, y_vals, indexing="ij"))
+    gamma_values = obstacle.get_gamma_batch(
+        positions.reshape(dim, -1), in_global_frame=True
+    ).reshape(n_resolution, n_resolution)
 
     cs = ax.contourf(
         positions[0, :, :],
@@ -128,8 +128,6 @@ class DynamicEllipse(Ellipse):
         self.orientation = self.orientation + time_step * self.angular_velocity
 
         # Random change of axes
-        self.axes_length = self.axes_length
-
         for ii in range(self.dim):
             delta_vel_range = [
                 self.axis_range[0] - self.axes_length[ii],
@@ -153,6 +151,9 @@ class DynamicEllipse(Ellipse):
                 self.axes_length[ii] = self.axis_minimum
                 self.expansion_vel[ii] = 0
 
+        # Reassign, such that the axes with margin are updated
+        self.axes_length = self.axes_length
+
         if self.save_trajectory:
             self.position_list = np.vstack((self.position_list.T, self.position)).T
 
@@ -58,8 +58,10 @@ def main(simulationNumber=0, saveFigures=False):
                 [a2, -a2, l],
                 [a2, a2, l],
                 [-a2, a2, l],
-            ]
+            ],
+            dtype=np.float32,
         ).T
+        points = np.ascontiguousarray(points)
 
         indeces_of_tiles = np.array(
             [
@@ -69,7 +71,8 @@ def main(simulationNumber=0, saveFigures=False):
                 [1, 2, 5, 6],
                 [2, 3, 6, 7],
                 [3, 0, 7, 5],
-            ]
+            ],
+            dtype=np.int32,
         )
 
         obs = ObstacleContainer([DynamicBoundariesPolygon(is_surgery_setup=True)])
@@ -0,0 +1,103 @@
+"""
+Test script for obstacle avoidance algorithm
+Test batched gamma and normal evaluation of the obstacles
+"""
+from math import pi
+
+import numpy as np
+
+from dynamic_obstacle_avoidance.obstacles import Ellipse, Cuboid, Polygon
+from dynamic_obstacle_avoidance.obstacles import StarshapedFlower, FlatPlane
+from dynamic_obstacle_avoidance.utils import obs_check_collision_2d
+
+
+def test_gamma_batch_equals_pointwise_evaluation():
+    obstacle = Ellipse(
+        center_position=np.array([1.0, 0.5]),
+        axes_length=np.array([1.0, 2.0]),
+        orientation=30 * np.pi / 180,
+        margin_absolut=0.1,
+    )
+
+    positions = np.random.default_rng(0).uniform(-4, 4, (2, 50))
+    gammas = obstacle.get_gamma_batch(positions, in_global_frame=True)
+
+    for ii in range(positions.shape[1]):
+        assert np.isclose(
+            gammas[ii], obstacle.get_gamma(positions[:, ii], in_global_frame=True)
+        )
+
+
+def test_normal_batch_with_outside_reference_point():
+    obstacle = Ellipse(
+        center_position=np.array([1.0, 0.5]),
+        axes_length=np.array([1.0, 2.0]),
+        orientation=30 * np.pi / 180,
+    )
+    obstacle.set_reference_point(np.array([2.0, 0.4]), in_global_frame=True)
+
+    positions = np.random.default_rng(1).uniform(-4, 4, (2, 50))
+    normals = obstacle.get_normal_direction_batch(positions, in_global_frame=True)
+
+    for ii in range(positions.shape[1]):
+        assert np.allclose(
+            normals[:, ii],
+            obstacle.get_normal_direction(positions[:, ii], in_global_frame=True),
+        )
+
+
+def test_gamma_batch_of_non_ellipse_obstacles():
+    obstacles = [
+        Cuboid(
+            axes_length=np.array([1.0, 2.0]),
+            center_position=np.array([0.5, 0.2]),
+            orientation=20 * pi / 180,
+        ),
+        Polygon(edge_points=np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]).T),
+        StarshapedFlower(
+            center_position=np.array([0.0, 0.0]),
+            radius_magnitude=0.2,
+            number_of_edges=5,
+            radius_mean=0.75,
+            orientation=33 / 180 * pi,
+            distance_scaling=1,
+        ),
+        FlatPlane(center_position=np.array([0.0, 0.0]), normal=np.array([0.0, 1.0])),
+    ]
+
+    positions = np.random.default_rng(2).uniform(-3, 3, (2, 20))
+    for obstacle in obstacles:
+        gammas = obstacle.get_gamma_batch(positions, in_global_frame=True)
+
+        for ii in range(positions.shape[1]):
+            assert np.isclose(
+                gammas[ii],
+                obstacle.get_gamma(positions[:, ii], in_global_frame=True),
+            )
+
+
+def test_collision_check_with_cuboid():
+    obstacle = Cuboid(
+        axes_length=np.array([1.0, 2.0]),
+        center_position=np.array([0.5, 0.2]),
+        orientation=20 * pi / 180,
+    )
+
+    x_vals, y_vals = np.meshgrid(np.linspace(-2, 3, 10), np.linspace(-2, 3, 8))
+    collision_free = obs_check_collision_2d([obstacle], x_vals, y_vals)
+
+    assert collision_free.shape == x_vals.shape
+    for ix in range(x_vals.shape[0]):
+        for iy in range(x_vals.shape[1]):
+            position = np.array([x_vals[ix, iy], y_vals[ix, iy]])
+            assert collision_free[ix, iy] == (
+                obstacle.get_gamma(position, in_global_frame=True) > 1
+            )
+
+
+if (__name__) == "__main__":
+    test_gamma_batch_equals_pointwise_evaluation()
+    test_normal_batch_with_outside_reference_point()
+    test_gamma_batch_of_non_ellipse_obstacles()
+    test_collision_check_with_cuboid()
+    print("Tests done.")
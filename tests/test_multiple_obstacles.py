@@ -11,7 +11,7 @@ import numpy as np
 from math import pi
 
 from dynamic_obstacle_avoidance.obstacles import Ellipse, CircularObstacle
-from dynamic_obstacle_avoidance.obstacles import Cuboid
+from dynamic_obstacle_avoidance.obstacles import Cuboid, GammaType
 from dynamic_obstacle_avoidance.containers import GradientContainer
 
 from dynamic_obstacle_avoidance.visualization import Simulation_vectorFields
@@ -145,11 +145,52 @@ def test_two_intersecting_ellipses(visualize=False):
         ), "Warning reference point outside obstacle"
 
 
+def test_gamma_sum_derivative_with_cuboid():
+    """Gradient of the gamma-cost between an ellipse and a cuboid."""
+    obs_list = GradientContainer()
+    obs_list.append(
+        Ellipse(
+            axes_length=np.array([1, 1.5]),
+            center_position=[0.0, 0.0],
+        )
+    )
+    obs_list.append(
+        Cuboid(
+            axes_length=np.array([2, 1.0]),
+            center_position=np.array([1.2, 0.3]),
+            orientation=10.0 / 180 * pi,
+        )
+    )
+
+    position = np.array([0.6, 0.2])
+    delta_dist = 1e-6
+    derivative = obs_list.derivative_gamma_sum(
+        position,
+        obs_list[0],
+        obs_list[1],
+        delta_dist=delta_dist,
+        gamma_type=GammaType.EUCLEDIAN,
+    )
+
+    def get_cost(pos):
+        cost = obs_list.get_gamma_cost_function(
+            obs_list[0].get_gamma(pos, in_global_frame=True)
+        )
+        return cost + obs_list.get_gamma_cost_function(
+            obs_list[1].get_gamma(pos, in_global_frame=True), obs_list[1].is_boundary
+        )
+
+    for dd, delta in enumerate(delta_dist * np.eye(2)):
+        delta_cost = get_cost(position + delta) - get_cost(position)
+        assert np.isclose(derivative[dd], delta_cost / delta_dist)
+
+
 if (__name__) == "__main__":
     plot_results = False
 
     test_two_intersecting_circles(plot_results)
     test_three_intersecting_circles(plot_results)
     test_two_intersecting_ellipses(plot_results)
+    test_gamma_sum_derivative_with_cuboid()
 
     print("Selected tests complete.")
@@ -0,0 +1,164 @@
+"""
+Test script for obstacle avoidance algorithm
+Test the batched evaluation of the navigation container
+"""
+from math import pi
+
+import numpy as np
+
+from dynamic_obstacle_avoidance.obstacles import Ellipse
+from dynamic_obstacle_avoidance.comparison.avoidance_comparison.navigation import (
+    NavigationContainer,
+    get_beta,
+)
+
+
+def get_navigation_container():
+    container = NavigationContainer(attractor_position=np.array([3.0, 0.0]))
+    container.append(
+        Ellipse(
+            center_position=np.array([-1.0, 0.5]),
+            axes_length=np.array([0.6, 1.0]),
+            orientation=20 * pi / 180,
+        )
+    )
+    container.append(
+        Ellipse(
+            center_position=np.array([1.0, -0.5]),
+            axes_length=np.array([0.8, 0.5]),
+        )
+    )
+    return container
+
+
+def move_obstacles(container):
+    """Changes the obstacles in place, i.e., without notifying the container."""
+    container[0].center_position = np.array([-0.5, 1.0])
+    container[0].orientation = 60 * pi / 180
+    container[1].axes_length = np.array([1.0, 0.7])
+
+
+def test_gamma_arrays_after_moving_obstacle():
+    container = get_navigation_container()
+    positions = np.random.default_rng(0).uniform(-3, 3, (2, 40))
+
+    # Evaluate once before the obstacles are moved
+    container.evaluate_grid(positions)
+    move_obstacles(container)
+
+    beta_values = container.get_beta_values(positions)
+    collisions = container.check_collision_array(positions)
+    for oo, obstacle in enumerate(container):
+        assert np.allclose(beta_values[oo], get_beta(obstacle, positions))
+
+    for ii in range(positions.shape[1]):
+        assert collisions[ii] == container.is_position_colliding(positions[:, ii])
+
+
+def test_sphereworld_transform_after_moving_obstacle():
+    container = get_navigation_container()
+    positions = np.random.default_rng(1).uniform(-3, 3, (2, 40))
+
+    # Evaluate once before the obstacles are moved
+    container.transform_to_sphereworld(positions)
+    move_obstacles(container)
+
+    # Freshly created container with the same (moved) obstacles
+    container_moved = get_navigation_container()
+    move_obstacles(container_moved)
+
+    assert np.allclose(
+        container.transform_to_sphereworld(positions),
+        container_moved.transform_to_sphereworld(positions),
+    )
+    assert np.allclose(
+        container.evaluate_navigation_function(positions),
+        container_moved.evaluate_navigation_function(positions),
+    )
+
+
+def test_analytic_navigation_gradient():
+    """Analytic gradient with a boundary, a margin and a non-unit curvature."""
+    container = NavigationContainer(attractor_position=np.array([2.0, 0.5]))
+    container.append(
+        Ellipse(
+            center_position=np.array([0.0, 0.0]),
+            axes_length=np.array([4.0, 3.0]),
+            orientation=10 * pi / 180,
+            is_boundary=True,
+        )
+    )
+    container.append(
+        Ellipse(
+            center_position=np.array([-1.0, 0.5]),
+            axes_length=np.array([0.6, 0.4]),
+            orientation=30 * pi / 180,
+            curvature=2,
+            margin_absolut=0.1,
+        )
+    )
+    container.append(
+        Ellipse(
+            center_position=np.array([1.0, -0.8]),
+            axes_length=np.array([0.5, 0.3]),
+        )
+    )
+    container[2].set_reference_point(np.array([1.2, -0.8]), in_global_frame=True)
+
+    positions = np.random.default_rng(3).uniform(-2.5, 2.5, (2, 100))
+    positions = positions[:, ~container.check_collision_array(positions)]
+    gradient = container.navigation_gradient(positions)
+
+    delta_dist = 1e-6
+    for dd, delta in enumerate(delta_dist * np.eye(2)):
+        value_high = container.evaluate_navigation_function(
+            positions + delta[:, np.newaxis]
+        )
+        value_low = container.evaluate_navigation_function(
+            positions - delta[:, np.newaxis]
+        )
+        assert np.allclose(
+            gradient[dd], (value_high - value_low) / (2 * delta_dist), atol=1e-6
+        )
+
+
+def test_batch_integration_equals_single_integration():
+    container = NavigationContainer(attractor_position=np.array([2.0, 0.0]))
+    container.append(
+        Ellipse(
+            center_position=np.array([0.0, 0.0]),
+            axes_length=np.array([0.5, 0.8]),
+        )
+    )
+
+    start_positions = np.array([[-2.0, 0.5], [-1.5, -1.0], [0.5, 1.5]]).T
+    n_steps = 1000
+    trajectories = container.integrate_batch(
+        start_positions, n_steps=n_steps, delta_time=0.1
+    )
+
+    # Cut short, once all trajectories have converged
+    assert trajectories.shape[1] < n_steps + 1
+
+    for ii in range(start_positions.shape[1]):
+        trajectory = container.integrate_batch(
+            start_positions[:, ii : ii + 1], n_steps=n_steps, delta_time=0.1
+        )[:, :, 0]
+        n_points = trajectory.shape[1]
+        assert n_points <= trajectories.shape[1]
+        assert np.allclose(trajectories[:, :n_points, ii], trajectory)
+
+        # Converged trajectories are not updated anymore
+        assert np.allclose(
+            trajectories[:, n_points:, ii], trajectory[:, -1:], atol=1e-12
+        )
+        assert np.allclose(trajectory[:, -1], container.attractor_position, atol=1e-1)
+
+
+if (__name__) == "__main__":
+    test_gamma_arrays_after_moving_obstacle()
+    test_sphereworld_transform_after_moving_obstacle()
+    test_analytic_navigation_gradient()
+    test_batch_integration_equals_single_integration()
+
+    print("Tests done.")
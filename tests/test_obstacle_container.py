@@ -8,6 +8,7 @@ from math import pi
 
 from dynamic_obstacle_avoidance.obstacles import Ellipse, Cuboid
 from dynamic_obstacle_avoidance.containers import GradientContainer
+from dynamic_obstacle_avoidance.containers import ObstacleContainer
 
 import pytest
 
@@ -81,8 +82,36 @@ def test_obstacle_container_deleting():
             )
 
 
+def test_gamma_array_of_ellipse_and_cuboid():
+    """Array evaluation of a container with mixed obstacle types."""
+    obs = ObstacleContainer()
+    obs.append(
+        Ellipse(
+            axes_length=[1.0, 1.5],
+            center_position=[-1.5, 0.0],
+            orientation=30.0 / 180 * pi,
+        )
+    )
+    obs.append(
+        Cuboid(
+            axes_length=np.array([2, 1.0]),
+            center_position=np.array([1.0, 0.5]),
+            orientation=10.0 / 180 * pi,
+        )
+    )
+
+    positions = np.random.default_rng(0).uniform(-3, 3, (2, 30))
+    min_gammas = obs.get_minimum_gamma_of_array(positions)
+    collisions = obs.check_collision_array(positions)
+
+    for ii in range(positions.shape[1]):
+        assert np.isclose(min_gammas[ii], obs.get_minimum_gamma(positions[:, ii]))
+        assert collisions[ii] == obs.is_position_colliding(positions[:, ii])
+
+
 if (__name__) == "__main__":
     test_obstacle_container_appending()
     test_obstacle_container_deleting()
+    test_gamma_array_of_ellipse_and_cuboid()
 
     print("Done all.")
@@ -0,0 +1,47 @@
+"""
+Test script for obstacle avoidance algorithm
+Test the relative velocity of deforming obstacles
+"""
+import numpy as np
+
+from dynamic_obstacle_avoidance.obstacles import CircularObstacle
+from dynamic_obstacle_avoidance.utils import get_relative_obstacle_velocity
+
+
+def test_velocity_of_deforming_circular_boundary():
+    """Shrinking wall as it is created by the crowd container."""
+    obstacle = CircularObstacle(
+        center_position=np.array([0.0, 0.0]),
+        orientation=0,
+        radius=3.0,
+        is_boundary=True,
+        is_deforming=True,
+        tail_effect=False,
+    )
+    obstacle.inflation_speed_radial = -1.0
+
+    position = np.array([1.0, 1.0])
+    gamma = obstacle.get_gamma(position, in_global_frame=True)
+
+    normal = obstacle.get_normal_direction(position, in_global_frame=True)
+    E_orth = np.zeros((2, 2, 1))
+    E_orth[:, 0, 0] = normal
+    E_orth[:, 1, 0] = [-normal[1], normal[0]]
+
+    velocity = get_relative_obstacle_velocity(
+        position,
+        [obstacle],
+        E_orth=E_orth,
+        weights=[1.0],
+        velocity_only_in_positive_normal_direction=False,
+    )
+
+    # The radial velocity of the surface is pointing inwards
+    weight = np.exp((-1) * (max(gamma, 1) - 1))
+    assert np.allclose(velocity, (-1) * weight * position / np.linalg.norm(position))
+
+
+if (__name__) == "__main__":
+    test_velocity_of_deforming_circular_boundary()
+
+    print("Tests done.")